@@ -0,0 +1,38 @@
+"""release emails of deleted doctors and admin users
+
+Revision ID: b2e8d4a6c317
+Revises: a7c3e5f19b28
+Create Date: 2026-10-17 18:12:44.201736
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8d4a6c317'
+down_revision = 'a7c3e5f19b28'
+branch_labels = None
+depends_on = None
+
+
+# table -> email length
+EMAIL_TABLES = {
+    'doctors': 60,
+    'admin_users': 200,
+}
+
+
+def upgrade():
+    # Deleted rows keep their email under the unique index, rename them the way delete does now
+    for table, length in EMAIL_TABLES.items():
+        op.execute(f"""
+            UPDATE {table}
+            SET email = CONCAT(LEFT(email, {length - 37}), '#', id)
+            WHERE is_deleted = 1 AND email IS NOT NULL AND email NOT LIKE '%#%'
+        """)
+
+
+def downgrade():
+    # Released emails are not restored
+    pass
@@ -5,6 +5,30 @@ config = {
     "db_pass": "Database password",
     "salt": b"Password Salt value",
     "jwt_key": {},  
+    "token_format": "nested", # "nested" (signed + encrypted) or "compact" (signed only)
+    "token_expiry": 1440, # Int - In minutes, used by compact tokens
     "otp_time": 10, # Int - In minutes
     "url": "URL of frontend website",
+    "count_cache_size": 10000, # Int - Max cached list counts
+    "count_cache_ttl": 60, # Int - In seconds
+    "fulltext_search": True, # Bool - Use MySQL FULLTEXT indexes for search, LIKE otherwise
+    "fulltext_min_token_size": 3, # Int - innodb_ft_min_token_size of the server, shorter words are searched with LIKE
+    "free_slot_max_days": 180, # Int - Longest range accepted by free slot search
+    "catalog_cache_ttl": 300, # Int - In seconds, how long other workers may serve an old specialization catalog
+    "analytics_max_days": 366, # Int - Longest range accepted by analytics endpoints
+    "all_max_rows": 5000, # Int - Max rows /doctors/all and /patients/all build in memory
+    "stream_max_rows": 100000, # Int - Max rows of their stream=true mode
+    "export_chunk_size": 1000, # Int - Rows fetched and written per chunk by streaming exports
+    "sweeper_interval": 300, # Int - Seconds between runs of the expired appointment sweeper, 0 disables it
+    "sweeper_batch_size": 500, # Int - Appointments completed per sweeper transaction
+    "bulk_booking_limit": 100, # Int - Max appointments in one bulk booking
+    "booking_engine": "range", # "range" (locked overlap check) or "slots" (unique slot reservations)
+    "slot_minutes": 15, # Int - Slot size used by the "slots" booking engine
+    "appointment_index": False, # Bool - In-memory availability index, single worker deployments only
+    "token_cache_size": 10000, # Int - Max verified tokens kept in memory
+    "token_cache_ttl": 300, # Int - In seconds
+    "principal_cache_size": 10000, # Int - Max verified users kept in memory
+    "principal_cache_ttl": 30, # Int - In seconds
+    "hash_workers": 4, # Int - Threads used for bcrypt hashing
+    "hash_queue_size": 32, # Int - Waiting hash jobs before requests get 503
 }
\ No newline at end of file
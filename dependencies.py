@@ -1,10 +1,28 @@
+from fastapi import Depends, Header
+from sqlalchemy.orm import Session
+
 from database import SessionLocal
+from routers.admin.v1.crud.auth import verify_token
 
 
-# Dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def authenticate(role: str):
+    def get_principal(token: str = Header(None), db: Session = Depends(get_db)):
+        return verify_token(db, token=token, role=role)
+    return get_principal
+
+
+def authenticate_doctor_or_patient(
+    is_doctor: bool = True,
+    token: str = Header(None),
+    db: Session = Depends(get_db)
+):
+    role = "doctor" if is_doctor else "patient"
+    return verify_token(db, token=token, role=role)
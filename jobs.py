@@ -0,0 +1,11 @@
+from config import config
+from database import SessionLocal
+from routers.admin.v1.crud.appointments import complete_expired_appointments
+
+
+def sweep_appointments():
+    db = SessionLocal()
+    try:
+        return complete_expired_appointments(db=db, batch_size=config.get("sweeper_batch_size", 500))
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+import csv
+import enum
+import io
+import json
+
+from datetime import datetime
+from decimal import Decimal
+from enum import Enum
+from fastapi import HTTPException, status
+
+
+class ExportFormatEnum(enum.Enum):
+    """
+    Export Formats
+    - ndjson : one JSON object per line
+    - csv : header row followed by one row per record
+    """
+
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormatEnum.ndjson: "application/x-ndjson",
+    ExportFormatEnum.csv: "text/csv",
+}
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    value = export_value(value)
+    return value if isinstance(value, str) else str(value)
+
+
+def check_max_rows(count: int, max_rows: int, detail: str):
+    if count > max_rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def iter_chunks(query, id_column, chunk_size: int):
+    """
+    Rows of `query` in id order, `chunk_size` rows per short keyset query
+    - No cursor stays open between chunks, so callers can run other queries per chunk
+    """
+    last_id = None
+    while True:
+        chunk_query = query if last_id is None else query.filter(id_column > last_id)
+        rows = chunk_query.order_by(id_column).limit(chunk_size).all()
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = getattr(rows[-1], id_column.key)
+
+
+def stream_json_array(chunks):
+    """
+    One JSON array written chunk by chunk from lists of dicts
+    """
+    yield "["
+    separator = ""
+    for items in chunks:
+        if not items:
+            continue
+        yield separator + ",".join(json.dumps(item, default=json_default, separators=(",", ":")) for item in items)
+        separator = ","
+    yield "]"
+
+
+def stream_ndjson(rows, fields: list, chunk_size: int):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, map(export_value, row))), default=str))
+        if len(lines) >= chunk_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_csv(rows, fields: list, chunk_size: int):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([export_value(value) for value in row])
+        if count % chunk_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+    yield output.getvalue()
+
+
+def stream_rows(rows, fields: list, export_format: ExportFormatEnum, chunk_size: int = 1000):
+    """
+    Serialize tuples straight to text chunks of `chunk_size` rows
+    - Rows are never turned into ORM objects or Pydantic models
+    """
+    if export_format == ExportFormatEnum.csv:
+        return stream_csv(rows, fields, chunk_size)
+    return stream_ndjson(rows, fields, chunk_size)
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+
+
+def http_date(value: datetime):
+    # Naive datetimes are stored in server local time
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def validator_headers(etag: str, last_modified: datetime = None):
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    return headers
+
+
+def opaque_tag(etag: str):
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime = None):
+    """
+    Whether a conditional GET can be answered with 304
+    - If-None-Match takes precedence over If-Modified-Since and uses the weak comparison
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [opaque_tag(tag.strip()) for tag in if_none_match.split(",")]
+        return "*" in tags or opaque_tag(etag) in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since is None or since.tzinfo is None:
+            return False
+        return last_modified.astimezone(timezone.utc).replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+
+
+def escape_text(value: str):
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def format_utc(value: datetime):
+    # Naive datetimes are stored in server local time
+    return value.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold_line(line: str):
+    """
+    Content line folded at 75 octets without splitting UTF-8 characters
+    """
+    parts = []
+    current = ""
+    size = 0
+    limit = 75
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            parts.append(current)
+            current, size, limit = "", 0, 74
+        current += char
+        size += char_size
+    parts.append(current)
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def format_event(event: dict):
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{event['uid']}",
+        f"DTSTAMP:{format_utc(event['stamp'])}",
+        f"DTSTART:{format_utc(event['start'])}",
+        f"DTEND:{format_utc(event['end'])}",
+        f"STATUS:{event['status']}",
+        f"SUMMARY:{escape_text(event['summary'])}",
+    ]
+    if event.get("description"):
+        lines.append(f"DESCRIPTION:{escape_text(event['description'])}")
+    lines.append("END:VEVENT")
+    return "".join(fold_line(line) for line in lines)
+
+
+def stream_calendar(name: str, events, chunk_size: int):
+    """
+    iCalendar (RFC 5545) text in chunks of `chunk_size` events
+    - `events` is any iterable of dicts with uid, stamp, start, end, status, summary and description
+    """
+    yield "".join(fold_line(line) for line in [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Appointments//Appointments API//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ])
+    chunk = []
+    for event in events:
+        chunk.append(format_event(event))
+        if len(chunk) >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("END:VCALENDAR\r\n")
+    yield "".join(chunk)
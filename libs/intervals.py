@@ -0,0 +1,81 @@
+import threading
+
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import timedelta
+from itertools import islice
+
+
+Interval = namedtuple("Interval", ["from_time", "to_time", "id"])
+
+
+class IntervalIndex:
+    """
+    In-process sorted interval lists per key
+    - Keys stay cold until `load` stores their intervals
+    - `add` and `remove` on a cold key only bump its version, so a load that
+      raced with a write is discarded instead of storing stale intervals
+    """
+
+    def __init__(self):
+        self._intervals = {}
+        self._max_span = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def load(self, key, intervals, version):
+        intervals = sorted(intervals)
+        with self._lock:
+            if self._versions.get(key, 0) != version:
+                return False
+            self._intervals[key] = intervals
+            self._max_span[key] = max(
+                (interval.to_time - interval.from_time for interval in intervals),
+                default=timedelta(0),
+            )
+            return True
+
+    def add(self, key, interval):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            intervals = self._intervals.get(key)
+            if intervals is None:
+                return
+            insort(intervals, interval)
+            self._max_span[key] = max(self._max_span[key], interval.to_time - interval.from_time)
+
+    def remove(self, key, id):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            intervals = self._intervals.get(key)
+            if intervals is None:
+                return
+            self._intervals[key] = [interval for interval in intervals if interval.id != id]
+
+    def overlapping(self, key, from_time, to_time):
+        """
+        Intervals with from_time <= `to_time` and to_time >= `from_time`,
+        or None while the key is cold
+        """
+        with self._lock:
+            intervals = self._intervals.get(key)
+            if intervals is None:
+                return None
+            # Nothing starting before this point can be long enough to overlap
+            position = bisect_left(intervals, (from_time - self._max_span[key],))
+            result = []
+            for interval in islice(intervals, position, None):
+                if interval.from_time > to_time:
+                    break
+                if interval.to_time >= from_time:
+                    result.append(interval)
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._intervals.clear()
+            self._max_span.clear()
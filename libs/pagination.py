@@ -0,0 +1,186 @@
+import enum
+import json
+import threading
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from dateutil.parser import isoparse
+from enum import Enum
+from fastapi import HTTPException, status
+from sqlalchemy import and_, case, or_
+from sqlalchemy import Enum as EnumType
+
+from config import config
+from libs.cache import TTLCache
+
+
+class CountStrategyEnum(enum.Enum):
+    """
+    Count Strategies
+    - exact : count(*) on every request
+    - cached : count(*) cached per table and filter set until a write on the table
+    - estimate : no count(*), lower bound from the page plus has_more
+    """
+
+    exact = "exact"
+    cached = "cached"
+    estimate = "estimate"
+
+
+count_cache = TTLCache(
+    maxsize=config.get("count_cache_size", 10000),
+    ttl=config.get("count_cache_ttl", 60),
+)
+count_versions = {}
+count_versions_lock = threading.Lock()
+
+
+def invalidate_counts(table: str):
+    with count_versions_lock:
+        count_versions[table] = count_versions.get(table, 0) + 1
+
+
+def table_version(table: str):
+    # Bumped by invalidate_counts on every write, usable as a cache key by other caches of the table
+    return count_versions.get(table, 0)
+
+
+def count_rows(query, count_strategy: CountStrategyEnum, count_key: tuple):
+    if count_strategy != CountStrategyEnum.cached or count_key is None:
+        return query.count()
+
+    # The table version changes on every write, so stale entries are never read again
+    key = (count_key[0], table_version(count_key[0])) + tuple(count_key[1:])
+    count = count_cache.get(key)
+    if count is None:
+        count = query.count()
+        count_cache.set(key, count)
+    return count
+
+
+def encode_cursor(sort_by: str, descending: bool, value, id: str):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Enum):
+        value = value.value
+    elif value is not None and not isinstance(value, (str, int, float)):
+        value = str(value)
+    data = json.dumps([sort_by, descending, value, id], separators=(",", ":"))
+    return urlsafe_b64encode(data.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool, sort_column):
+    try:
+        data = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort_by, cursor_descending, value, id = json.loads(data)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if cursor_sort_by != sort_by or cursor_descending != descending:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not match sort_by and order."
+        )
+    if value is not None:
+        python_type = sort_column.type.python_type
+        try:
+            value = isoparse(value) if python_type is datetime else python_type(value)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    return value, id
+
+
+def enum_position(sort_column):
+    # Position among the declared values, the order MySQL gives a native ENUM
+    return case(
+        {name: position for position, name in enumerate(sort_column.type.enums)},
+        value=sort_column,
+    )
+
+
+def keyset_filter(sort_column, id_column, descending: bool, value, last_id: str):
+    """
+    Rows after (value, last_id) in the page order
+    - NULL sort values come first ascending and last descending, as in MySQL
+    """
+    if value is None:
+        if descending:
+            return and_(sort_column.is_(None), id_column < last_id)
+        return or_(sort_column.isnot(None), and_(sort_column.is_(None), id_column > last_id))
+    if descending:
+        return or_(
+            sort_column < value,
+            and_(sort_column == value, id_column < last_id),
+            sort_column.is_(None),
+        )
+    return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+
+
+def paginate(
+    query,
+    start: int,
+    limit: int,
+    cursor: str,
+    sort_by: str,
+    sort_column,
+    descending: bool,
+    id_column,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
+    count_key: tuple = None,
+):
+    """
+    Count `query`, order it by the sort column with the id as tie breaker and fetch one page
+    - With a cursor the page starts right after the row it encodes (keyset)
+    - Without one it falls back to offset pagination from `start`
+    - `count_key` is the table name followed by the normalized filters, used by the cached strategy
+    - `next_cursor` is set whenever there are more rows
+    """
+    if count_strategy != CountStrategyEnum.estimate:
+        count = count_rows(query, count_strategy, count_key)
+
+    sort_key = sort_column.key
+    enum_type = sort_column.type if isinstance(sort_column.type, EnumType) else None
+    if enum_type is not None:
+        # MySQL orders a native ENUM by position but compares it as a string, sort on the
+        # position explicitly, the offset order stays the same and the cursor filter agrees
+        cursor_column, sort_column = sort_column, enum_position(sort_column)
+    else:
+        cursor_column = sort_column
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    if cursor:
+        if sort_key is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cursor is not supported for {sort_by}."
+            )
+        value, last_id = decode_cursor(cursor, sort_by, descending, cursor_column)
+        if enum_type is not None and value is not None:
+            value = enum_type.enums.index(value.name)
+        query = query.filter(keyset_filter(sort_column, id_column, descending, value, last_id))
+        start = 0
+    else:
+        query = query.offset(start)
+
+    # One extra row tells whether another page exists
+    results = query.limit(limit + 1).all()
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    if count_strategy == CountStrategyEnum.estimate:
+        count = start + len(results) + (1 if has_more else 0)
+
+    next_cursor = None
+    if has_more and results and sort_key is not None:
+        last = results[-1]
+        next_cursor = encode_cursor(sort_by, descending, getattr(last, sort_key), last.id)
+
+    data = {
+        "count": count,
+        "list": results,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        "count_strategy": count_strategy,
+    }
+    return data
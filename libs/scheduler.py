@@ -0,0 +1,18 @@
+import asyncio
+import traceback
+
+from fastapi.concurrency import run_in_threadpool
+
+
+async def run_periodically(func, interval: float, *args):
+    """
+    Run the blocking `func` in the threadpool every `interval` seconds until cancelled
+    - A failing run is logged and retried on the next tick
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(func, *args)
+        except Exception as e:
+            print(e)
+            print(traceback.format_exc())
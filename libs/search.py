@@ -0,0 +1,61 @@
+import re
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement, literal
+from sqlalchemy.types import Float
+
+from config import config
+
+
+class match_against(ColumnElement):
+    """
+    MySQL full-text relevance
+    - Renders MATCH (columns) AGAINST (:text IN BOOLEAN MODE)
+    - The columns must be exactly the columns of one FULLTEXT index
+    """
+
+    type = Float()
+    inherit_cache = False
+
+    def __init__(self, columns, against):
+        self.match_columns = columns
+        self.against = literal(against)
+
+
+@compiles(match_against)
+def compile_match_against(element, compiler, **kw):
+    return "MATCH (%s) AGAINST (%s IN BOOLEAN MODE)" % (
+        ", ".join(compiler.process(column, **kw) for column in element.match_columns),
+        compiler.process(element.against, **kw),
+    )
+
+
+# InnoDB's default stopword list, these words are never indexed
+INNODB_STOPWORDS = {
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i", "in",
+    "is", "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "who",
+    "will", "with", "und", "www",
+}
+
+
+def indexed_words(search: str):
+    # Shorter words and stopwords are not in the index, a required one would match nothing
+    min_token_size = config.get("fulltext_min_token_size", 3)
+    return [
+        word for word in re.findall(r"\w+", search)
+        if len(word) >= min_token_size and word.lower() not in INNODB_STOPWORDS
+    ]
+
+
+def fulltext_relevance(db, columns, search: str):
+    """
+    Relevance expression for `search`, or None when the backend has no full-text search
+    - Every indexed word is required and matched as a prefix, close to the old LIKE behaviour
+    - None as well when no word of `search` is indexed, callers fall back to LIKE
+    """
+    if not config.get("fulltext_search", True) or db.bind.dialect.name != "mysql":
+        return None
+    words = indexed_words(search)
+    if not words:
+        return None
+    return match_against(columns, " ".join(f"+{word}*" for word in words))
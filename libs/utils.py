@@ -1,12 +1,43 @@
+import json
+import asyncio
 import bcrypt
+import threading
 
+from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from jwcrypto import jwk, jwt
 from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
 
+from time import time
 from uuid import uuid4
 from datetime import datetime
 
 from config import config
+from libs.cache import TTLCache
+
+
+jwt_key = jwk.JWK(**config["jwt_key"])
+
+token_cache = TTLCache(
+    maxsize=config.get("token_cache_size", 10000),
+    ttl=config.get("token_cache_ttl", 300),
+)
+
+principal_cache = TTLCache(
+    maxsize=config.get("principal_cache_size", 10000),
+    ttl=config.get("principal_cache_ttl", 30),
+)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the request threads
+hash_executor = ThreadPoolExecutor(
+    max_workers=config.get("hash_workers", 4), thread_name_prefix="bcrypt"
+)
+hash_slots = threading.BoundedSemaphore(
+    config.get("hash_workers", 4) + config.get("hash_queue_size", 32)
+)
 
 
 def now():
@@ -21,6 +52,27 @@ def object_as_dict(obj):
     return {c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs}
 
 
+def eager_load(*paths):
+    """
+    Loader options for the relationships a response model serializes
+    - Pass a relationship attribute, or a tuple of them for a nested path
+    - Many-to-one hops are joined, collections are select-in loaded
+    """
+    options = []
+    for path in paths:
+        if not isinstance(path, tuple):
+            path = (path,)
+        loader = None
+        for attribute in path:
+            uselist = attribute.property.uselist
+            if loader is None:
+                loader = selectinload(attribute) if uselist else joinedload(attribute)
+            else:
+                loader = loader.selectinload(attribute) if uselist else loader.joinedload(attribute)
+        options.append(loader)
+    return options
+
+
 def create_password(password):
     password = bytes(password, "utf-8")
     password = bcrypt.hashpw(password, config["salt"])
@@ -28,19 +80,123 @@ def create_password(password):
     return password
 
 
-def get_token(user_id, email):
-    claims = {"id": user_id, "email": email, "time": str(now())}
+def verify_password(password, hashed):
+    password = bytes(password, "utf-8")
+    hashed = bytes(hashed, "utf-8")
+    return bcrypt.checkpw(password, hashed)
+
+
+async def run_hashing(func, *args):
+    if not hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is busy, please try again."
+        )
+    try:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(hash_executor, func, *args)
+    finally:
+        hash_slots.release()
+
+
+async def hash_password(password):
+    return await run_hashing(create_password, password)
+
+
+async def check_password(password, hashed):
+    return await run_hashing(verify_password, password, hashed)
+
+
+def is_duplicate_key(error):
+    # MySQL ER_DUP_ENTRY
+    return bool(error.orig.args) and error.orig.args[0] == 1062
+
+
+def save(db, instance):
+    db.add(instance)
+    db.commit()
+    db.refresh(instance)
+    return instance
+
+
+def save_unique(db, instance, detail: str):
+    """
+    save, with a unique key violation turned into 409 `detail`
+    - The unique index is the only check, so concurrent inserts cannot both succeed
+    """
+    try:
+        return save(db, instance)
+    except IntegrityError as e:
+        db.rollback()
+        if not is_duplicate_key(e):
+            raise
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+def release_email(email_column, email: str, id: str):
+    # "<email prefix>#<id>" is unique and never a valid address, the same rename the unique email migration uses
+    if email is None:
+        return None
+    return f"{email[:email_column.type.length - 37]}#{id}"
+
+
+def commit_loaded(db):
+    """
+    Commit without expiring the instances this session already loaded
+    - A session lives for one request, so its identity map doubles as the
+      request memo and the rows it just wrote need no reload for the response
+    """
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        db.commit()
+    finally:
+        db.expire_on_commit = expire_on_commit
+
+
+def get_token(user_id, email, role):
+    if config.get("token_format", "nested") == "compact":
+        # Signed only token, the claims carry no secrets
+        issued_at = int(time())
+        claims = {
+            "id": user_id,
+            "email": email,
+            "role": role,
+            "iat": issued_at,
+            "exp": issued_at + config.get("token_expiry", 1440) * 60,
+        }
+        Token = jwt.JWT(header={"alg": "HS256"}, claims=claims)
+        Token.make_signed_token(jwt_key)
+        return Token.serialize()
+
+    claims = {"id": user_id, "email": email, "role": role, "time": str(now())}
 
     # Create a signed token with the generated key
-    key = jwk.JWK(**config["jwt_key"])
     Token = jwt.JWT(header={"alg": "HS256"}, claims=claims)
-    Token.make_signed_token(key)
+    Token.make_signed_token(jwt_key)
 
     # Further encrypt the token with the same key
     encrypted_token = jwt.JWT(
         header={"alg": "A256KW", "enc": "A256CBC-HS512"}, claims=Token.serialize()
     )
-    encrypted_token.make_encrypted_token(key)
+    encrypted_token.make_encrypted_token(jwt_key)
     token = encrypted_token.serialize()
     return token
 
+
+def decode_token(token):
+    digest = sha256(token.encode("utf-8")).digest()
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+
+    if token.count(".") == 2:
+        # Compact signed token, jwcrypto rejects it once "exp" has passed
+        ST = jwt.JWT(key=jwt_key, jwt=token)
+    else:
+        # Decrypt the outer token and verify the signed token inside it
+        ET = jwt.JWT(key=jwt_key, jwt=token)
+        ST = jwt.JWT(key=jwt_key, jwt=ET.claims)
+    claims = json.loads(ST.claims)
+    ttl = claims["exp"] - time() if "exp" in claims else None
+    token_cache.set(digest, claims, ttl=ttl)
+    return claims
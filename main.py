@@ -1,9 +1,14 @@
+import asyncio
+
 from fastapi import FastAPI, Request, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from config import config
+from jobs import sweep_appointments
+from libs.scheduler import run_periodically
 from routers.admin.v1 import api as admin_v1
 
 app = FastAPI(
@@ -25,6 +30,21 @@ app.add_middleware(
 
 app.include_router(admin_v1.router)
 
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    sweeper_interval = config.get("sweeper_interval", 300)
+    if sweeper_interval > 0:
+        background_tasks.append(asyncio.ensure_future(run_periodically(sweep_appointments, sweeper_interval)))
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -0,0 +1,43 @@
+import argparse
+
+from database import SessionLocal
+from jobs import sweep_appointments
+from routers.admin.v1.crud.slots import rebuild_slots
+from routers.admin.v1.crud.stats import rebuild_stats
+
+
+def run_rebuild_slots(args):
+    db = SessionLocal()
+    try:
+        count = rebuild_slots(db=db)
+    finally:
+        db.close()
+    print(f"Reserved slots for {count} appointments")
+
+
+def run_rebuild_stats(args):
+    db = SessionLocal()
+    try:
+        count = rebuild_stats(db=db)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} doctor daily stat rows")
+
+
+def run_sweep_appointments(args):
+    count = sweep_appointments()
+    print(f"Completed {count} expired appointments")
+
+
+commands = {
+    "rebuild-slots": run_rebuild_slots,
+    "rebuild-stats": run_rebuild_stats,
+    "sweep-appointments": run_sweep_appointments,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Appointments maintenance commands")
+    parser.add_argument("command", choices=sorted(commands))
+    args = parser.parse_args()
+    commands[args.command](args)
@@ -1,7 +1,7 @@
 import enum
 
-from sqlalchemy import Column, String, DateTime, Boolean, Text, ForeignKey, Enum, DECIMAL
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, DateTime, Date, Boolean, Integer, Text, ForeignKey, Enum, DECIMAL, Index
+from sqlalchemy.orm import configure_mappers, relationship
 
 from datetime import datetime
 
@@ -47,6 +47,11 @@ class DoctorModel(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now)
 
+    __table_args__ = (
+        Index("ux_doctors_email", "email", unique=True),
+        Index("ft_doctors_search", "first_name", "last_name", "email", "number", mysql_prefix="FULLTEXT"),
+    )
+
 
 class SpecializationModel(Base):
     __tablename__ = "specializations"
@@ -87,6 +92,11 @@ class PatientModel(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now)
 
+    __table_args__ = (
+        Index("ux_patients_email", "email", unique=True),
+        Index("ft_patients_search", "first_name", "last_name", "email", "number", mysql_prefix="FULLTEXT"),
+    )
+
 
 class AppointmentModel(Base):
     __tablename__ = "appointments"
@@ -106,6 +116,40 @@ class AppointmentModel(Base):
     patient = relationship("PatientModel", backref="appointments")
     doctor = relationship("DoctorModel", backref="appointments")
 
+    __table_args__ = (
+        Index("ix_appointments_doctor_availability", "doctor_id", "is_deleted", "status", "from_time", "to_time"),
+        Index("ix_appointments_doctor_created", "doctor_id", "is_deleted", "created_at"),
+        Index("ix_appointments_patient_created", "patient_id", "is_deleted", "created_at"),
+        Index("ix_appointments_status_created", "is_deleted", "status", "created_at"),
+        Index("ix_appointments_created", "is_deleted", "created_at"),
+        Index("ix_appointments_from_time", "is_deleted", "from_time"),
+        Index("ft_appointments_description", "description", mysql_prefix="FULLTEXT"),
+    )
+
+
+class AppointmentSlotModel(Base):
+    __tablename__ = "appointment_slots"
+
+    doctor_id = Column(String(36), ForeignKey("doctors.id"), primary_key=True)
+    slot_start = Column(DateTime, primary_key=True)
+    appointment_id = Column(String(36), ForeignKey("appointments.id"), nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class DoctorDailyStatModel(Base):
+    __tablename__ = "doctor_daily_stats"
+
+    doctor_id = Column(String(36), ForeignKey("doctors.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(Enum(StatusEnum), primary_key=True)
+    appointments = Column(Integer, nullable=False, default=0)
+    booked_minutes = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ix_doctor_daily_stats_day", "day"),
+    )
+
 
 class AdminUserModel(Base):
     __tablename__ = "admin_users"
@@ -118,3 +162,11 @@ class AdminUserModel(Base):
     is_deleted = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index("ux_admin_users_email", "email", unique=True),
+    )
+
+
+# Create the backref attributes now, so modules can reference them in loader options at import time
+configure_mappers()
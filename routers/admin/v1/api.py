@@ -1,15 +1,20 @@
 
-from datetime import datetime
-from fastapi import APIRouter, Header, Response
+from datetime import date, datetime
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi import HTTPException, status, Depends, Path, Query
 from sqlalchemy.orm import Session
 from typing import List
 
+from libs.export import EXPORT_MEDIA_TYPES, ExportFormatEnum
+from libs.http import is_not_modified, validator_headers
+from libs.pagination import CountStrategyEnum
 from libs.utils import object_as_dict
 from models import GenderEnum, StatusEnum
 from routers.admin.v1 import schemas
-from dependencies import get_db
-from routers.admin.v1.crud import appointments, doctors, patients, specializations, users
+from dependencies import authenticate, authenticate_doctor_or_patient, get_db
+from routers.admin.v1.crud import appointments, doctors, patients, specializations, stats, users
+from routers.admin.v1.crud.auth import Principal
 
 router = APIRouter()
 
@@ -22,8 +27,8 @@ router = APIRouter()
     response_model=schemas.UserLoginResponse,
     tags=["Admin - Users"],
 )
-def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
-    db_user = users.sign_in(db, user)
+async def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
+    db_user = await users.sign_in(db, user)
     return db_user
 
 @router.post(
@@ -31,13 +36,12 @@ def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
     status_code=status.HTTP_201_CREATED,
     tags=["Admin - Users"]
 )
-def add_user(
+async def add_user(
     user: schemas.UserSignUp,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token=token)
-    user_id = users.add_user(db, user=user)
+    user_id = await users.add_user(db, user=user)
     return user_id
 
 
@@ -47,11 +51,10 @@ def add_user(
     tags=["Admin - Users"]
 )
 def get_my_profile(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     user_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token=token)
     db_user = users.get_user_profile(db, user_id=user_id)
     return db_user
 
@@ -63,11 +66,10 @@ def get_my_profile(
 )
 def update_profile(
     user: schemas.UserUpdate,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     user_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db),
 ):
-    users.verify_token(db, token=token)
     db_user = users.update_user_profile(db, user=user, user_id=user_id)
     return db_user
 
@@ -78,11 +80,10 @@ def update_profile(
     tags=["Admin - Users"]
 )
 def delete_user(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     user_id: str = Path(..., title="User ID", min_length=36, max_length=36),
     db: Session = Depends(get_db),
 ):
-    users.verify_token(db, token=token)
     users.delete_user(db, user_id=user_id)
     return Response(status_code=status.HTTP_200_OK)
 
@@ -96,17 +97,18 @@ def delete_user(
     tags=["Patients"]
 )
 def get_patient_list(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     start: int = 0,
     limit: int = 10,
     search: str = Query("all", min_length=1, max_length=50),
     sort_by: str = Query("all", min_length=3, max_length=50),
     order: str = Query("all", min_length=3, max_length=7),
     gender: GenderEnum = Query(None),
+    cursor: str = Query(None, max_length=500),
+    count_strategy: CountStrategyEnum = Query(CountStrategyEnum.exact),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
-    data = patients.get_patients_list(db, start, limit, search, sort_by, order, gender)
+    data = patients.get_patients_list(db, start, limit, search, sort_by, order, gender, cursor, count_strategy)
     return data
     
 
@@ -116,11 +118,11 @@ def get_patient_list(
     status_code=status.HTTP_201_CREATED,
     tags=["Patients"]
 )
-def add_patient(
+async def add_patient(
     patient: schemas.PatientsAdd,
     db: Session =  Depends(get_db)
 ):
-    data = patients.add_patient(db=db, patient=patient)
+    data = await patients.add_patient(db=db, patient=patient)
     return data
 
 
@@ -130,8 +132,8 @@ def add_patient(
     status_code=status.HTTP_200_OK,
     tags=["Patients"]
 )
-def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
-    data = patients.sign_in(db, user)
+async def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
+    data = await patients.sign_in(db, user)
     return data
 
 
@@ -140,12 +142,12 @@ def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
     status_code=status.HTTP_200_OK,
     tags=["Patients"]
 )
-def change_password(
+async def change_password(
     user: schemas.ChangePassword,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db),
 ):
-    patients.change_password(db, user=user, token=token)
+    await patients.change_password(db, user=user, patient_id=principal.id)
     return Response(status_code=status.HTTP_200_OK)
 
 
@@ -155,8 +157,12 @@ def change_password(
     tags=["Patients"]
 )
 def get_all_patients(
+    stream: bool = False,
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db)
 ):
+    if stream:
+        return StreamingResponse(patients.stream_all_patients(db), media_type="application/json")
     data = patients.get_all_patients(db)
     return data
 
@@ -167,15 +173,33 @@ def get_all_patients(
     tags=["Patients"]
 )
 def get_patient_by_id(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     patient_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
     data = patients.get_patient(db, patient_id)
     return data
 
 
+@router.get(
+    "/patients/{patient_id}/appointments.ics",
+    tags=["Patients"]
+)
+def get_patient_calendar(
+    request: Request,
+    patient_id: str = Path(..., min_length=36, max_length=36),
+    principal: Principal = Depends(authenticate_doctor_or_patient),
+    db: Session = Depends(get_db)
+):
+    db_patient = patients.get_patient(db, patient_id)
+    etag, last_modified = appointments.get_calendar_version(db, "patient", patient_id)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    data = appointments.get_calendar(db, "patient", patient_id, f"{db_patient.first_name} {db_patient.last_name}")
+    return StreamingResponse(data, media_type="text/calendar; charset=utf-8", headers=headers)
+
+
 @router.put(
     "/patients/{patient_id}",
     response_model=schemas.Patient,
@@ -183,11 +207,10 @@ def get_patient_by_id(
 )
 def update_patient(
     patient: schemas.PatientUpdate,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     patient_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
     data = patients.update_patient(db, patient_id, patient)
     return data
 
@@ -203,16 +226,16 @@ def update_patient(
     tags=["Specializations"]
 )
 def get_specialization_list(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     start: int = 0,
     limit: int = 10,
     search: str = Query("all", min_length=1, max_length=50),
     sort_by: str = Query("all", min_length=3, max_length=50),
     order: str = Query("all", min_length=3, max_length=7),
+    count_strategy: CountStrategyEnum = Query(CountStrategyEnum.exact),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
-    data = specializations.get_specialization_list(db, start, limit, search, sort_by, order)
+    data = specializations.get_specialization_list(db, start, limit, search, sort_by, order, count_strategy)
     return data
 
 
@@ -224,10 +247,9 @@ def get_specialization_list(
 )
 def add_specialization(
     specialization: schemas.SpecializationAdd,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
     data = specializations.add_specialization(db=db, specialization=specialization)
     return data
 
@@ -238,10 +260,15 @@ def add_specialization(
     tags=["Specializations"]
 )
 def get_all_specializations(
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    data = specializations.get_all_specialization(db=db)
-    return data
+    # The session only connects on a cache miss, a 304 never touches the database
+    catalog = specializations.get_specialization_catalog(db=db)
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if is_not_modified(request, catalog.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
 
 
 @router.get(
@@ -250,11 +277,10 @@ def get_all_specializations(
     tags=["Specializations"]
 )
 def get_specialization(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     specialization_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
     data = specializations.get_specialization(db=db, specialization_id=specialization_id)
     return data
 
@@ -272,6 +298,39 @@ def get_specialization_doctors(
     return data
 
 
+@router.get(
+    "/specializations/{specialization_id}/available-doctors",
+    response_model=schemas.DoctorList,
+    tags=["Specializations"]
+)
+def get_available_doctors(
+    from_time: datetime,
+    to_time: datetime,
+    specialization_id: str = Path(..., min_length=36, max_length=36),
+    start: int = 0,
+    limit: int = 10,
+    sort_by: str = Query("all", min_length=3, max_length=20),
+    order: str = Query("all", min_length=3, max_length=4),
+    cursor: str = Query(None, max_length=500),
+    count_strategy: CountStrategyEnum = Query(CountStrategyEnum.exact),
+    principal: Principal = Depends(authenticate("patient")),
+    db: Session = Depends(get_db)
+):
+    data = appointments.get_available_doctors(
+        db=db,
+        specialization_id=specialization_id,
+        from_time=from_time,
+        to_time=to_time,
+        start=start,
+        limit=limit,
+        sort_by=sort_by,
+        order=order,
+        cursor=cursor,
+        count_strategy=count_strategy
+    )
+    return data
+
+
 @router.put(
     "/specializations/{specialization_id}",
     response_model=schemas.Specialization,
@@ -280,10 +339,9 @@ def get_specialization_doctors(
 def update_specialization(
     specialization: schemas.SpecializationAdd,
     specialization_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
     data = specializations.update_specialization(db=db, specialization_id=specialization_id, specialization=specialization)
     return data
 
@@ -295,10 +353,9 @@ def update_specialization(
 )
 def delete_specialization(
     specialization_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
     specializations.delete_specialization(db=db, specialization_id=specialization_id)
     return Response(status_code=status.HTTP_200_OK)
 
@@ -314,16 +371,17 @@ def delete_specialization(
     tags=["Doctors"]
 )
 def get_doctor_list(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("admin")),
     start: int = 0,
     limit: int = 10,
     search: str = Query("all", min_length=1, max_length=50),
     sort_by: str = Query("all", min_length=3, max_length=50),
     order: str = Query("all", min_length=3, max_length=7),
+    cursor: str = Query(None, max_length=500),
+    count_strategy: CountStrategyEnum = Query(CountStrategyEnum.exact),
     db: Session = Depends(get_db)
 ):
-    users.verify_token(db, token)
-    data = doctors.get_doctors_list(db, start, limit, search, sort_by, order)
+    data = doctors.get_doctors_list(db, start, limit, search, sort_by, order, cursor, count_strategy)
     return data
 
 
@@ -333,11 +391,11 @@ def get_doctor_list(
     status_code=status.HTTP_201_CREATED,
     tags=["Doctors"]
 )
-def add_doctor(
+async def add_doctor(
     doctor: schemas.DoctorAdd,
     db: Session =  Depends(get_db)
 ):
-    data = doctors.add_doctor(db=db, doctor=doctor)
+    data = await doctors.add_doctor(db=db, doctor=doctor)
     return data
 
 
@@ -347,8 +405,8 @@ def add_doctor(
     status_code=status.HTTP_200_OK,
     tags=["Doctors"]
 )
-def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
-    data = doctors.sign_in(db, user)
+async def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
+    data = await doctors.sign_in(db, user)
     return data
 
 
@@ -357,12 +415,12 @@ def sign_in(user: schemas.SignIn, db: Session = Depends(get_db)):
     status_code=status.HTTP_200_OK,
     tags=["Doctors"]
 )
-def change_password(
+async def change_password(
     user: schemas.ChangePassword,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     db: Session = Depends(get_db),
 ):
-    doctors.change_password(db, user=user, token=token)
+    await doctors.change_password(db, user=user, doctor_id=principal.id)
     return Response(status_code=status.HTTP_200_OK)
 
 
@@ -372,8 +430,11 @@ def change_password(
     tags=["Doctors"]
 )
 def get_all_doctors(
+    stream: bool = False,
     db: Session = Depends(get_db)
 ):
+    if stream:
+        return StreamingResponse(doctors.stream_all_doctors(db), media_type="application/json")
     data = doctors.get_all_doctors(db)
     return data
 
@@ -384,15 +445,33 @@ def get_all_doctors(
     tags=["Doctors"]
 )
 def get_doctor_by_id(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     doctor_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    doctors.verify_token(db, token)
-    data = doctors.get_doctor(db, doctor_id)
+    data = doctors.get_doctor(db, doctor_id, relationships=doctors.DOCTOR_RESPONSE)
     return data
 
 
+@router.get(
+    "/doctors/{doctor_id}/appointments.ics",
+    tags=["Doctors"]
+)
+def get_doctor_calendar(
+    request: Request,
+    doctor_id: str = Path(..., min_length=36, max_length=36),
+    principal: Principal = Depends(authenticate_doctor_or_patient),
+    db: Session = Depends(get_db)
+):
+    db_doctor = doctors.get_doctor(db, doctor_id)
+    etag, last_modified = appointments.get_calendar_version(db, "doctor", doctor_id)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    data = appointments.get_calendar(db, "doctor", doctor_id, f"{db_doctor.first_name} {db_doctor.last_name}")
+    return StreamingResponse(data, media_type="text/calendar; charset=utf-8", headers=headers)
+
+
 @router.put(
     "/doctors/{doctor_id}",
     response_model=schemas.Doctor,
@@ -400,11 +479,10 @@ def get_doctor_by_id(
 )
 def update_doctor(
     patient: schemas.DoctorUpdate,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     doctor_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    doctors.verify_token(db, token)
     data = doctors.update_doctor(db, doctor_id, patient)
     return data
 
@@ -415,11 +493,10 @@ def update_doctor(
     tags=["Doctors"]
 )
 def delete_doctor(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     doctor_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    doctors.verify_token(db, token)
     data = doctors.delete_doctor(db=db, doctor_id=doctor_id)
     return data
 
@@ -431,12 +508,11 @@ def delete_doctor(
     tags=["Doctors"]
 )
 def add_doctor_specialization(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     doctor_id: str = Path(..., min_length=36, max_length=36),
     specialization_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    doctors.verify_token(db, token)
     data = doctors.add_doctor_specialization(db=db, doctor_id=doctor_id, specialization_id=specialization_id)
     return data
 
@@ -447,12 +523,11 @@ def add_doctor_specialization(
     tags=["Doctors"]
 )
 def delete_doctor_specialization(
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("doctor")),
     doctor_id: str = Path(..., min_length=36, max_length=36),
     specialization_id: str = Path(..., min_length=36, max_length=36),
     db: Session = Depends(get_db)
 ):
-    doctors.verify_token(db, token)
     doctors.delete_doctor_specialization(db=db, doctor_id=doctor_id, specialization_id=specialization_id)
     return Response(status_code=status.HTTP_200_OK)
 
@@ -477,15 +552,11 @@ def get_appointment_list(
     patient_id: str = Query("all", min_length=3, max_length=36),
     doctor_id: str = Query("all", min_length=3, max_length=36),
     status: StatusEnum = Query(None),
-    is_doctor: bool = True,
-    token: str = Header(None),
+    cursor: str = Query(None, max_length=500),
+    count_strategy: CountStrategyEnum = Query(CountStrategyEnum.exact),
+    principal: Principal = Depends(authenticate_doctor_or_patient),
     db: Session = Depends(get_db)
 ):
-    if is_doctor:
-        doctors.verify_token(db, token)
-    else:
-        patients.verify_token(db, token)
-    
     data = appointments.get_appointment_list(
         db=db,
         start=start,
@@ -495,7 +566,9 @@ def get_appointment_list(
         order=order,
         status=status,
         patient_id=patient_id,
-        doctor_id=doctor_id
+        doctor_id=doctor_id,
+        cursor=cursor,
+        count_strategy=count_strategy
     )
     return data
 
@@ -508,14 +581,28 @@ def get_appointment_list(
 )
 def add_appointment(
     appointment: schemas.AppointmentAdd,
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
     data = appointments.add_appointment(db=db, appointment=appointment)
     return data
 
 
+@router.post(
+    "/appointments/bulk",
+    response_model=schemas.AppointmentBulkResult,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Appointments"]
+)
+def add_appointments_bulk(
+    appointment: schemas.AppointmentBulkAdd,
+    principal: Principal = Depends(authenticate("patient")),
+    db: Session = Depends(get_db)
+):
+    data = appointments.add_appointments_bulk(db=db, appointment=appointment)
+    return data
+
+
 @router.get(
     "/appointments/availibility",
     tags=["Appointments"]
@@ -524,14 +611,62 @@ def check_appointment(
     from_time: datetime,
     to_time: datetime,
     doctor_id: str = Query(..., min_length=36, max_length=36),
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
     data = appointments.check_appointment(db, from_time, to_time, doctor_id)
     return data
 
 
+@router.get(
+    "/appointments/free-slots",
+    response_model=List[schemas.FreeSlot],
+    tags=["Appointments"]
+)
+def get_free_slots(
+    from_time: datetime,
+    to_time: datetime,
+    doctor_id: str = Query(..., min_length=36, max_length=36),
+    slot_minutes: int = Query(30, ge=5, le=480),
+    principal: Principal = Depends(authenticate("patient")),
+    db: Session = Depends(get_db)
+):
+    data = appointments.get_free_slots(db, from_time, to_time, doctor_id, slot_minutes)
+    return data
+
+
+@router.get(
+    "/appointments/export",
+    tags=["Appointments"]
+)
+def export_appointments(
+    search: str = Query("all", min_length=3, max_length=60),
+    sort_by: str = Query("all", min_length=3, max_length=20),
+    order: str = Query("all", min_length=3, max_length=4),
+    patient_id: str = Query("all", min_length=3, max_length=36),
+    doctor_id: str = Query("all", min_length=3, max_length=36),
+    status: StatusEnum = Query(None),
+    format: ExportFormatEnum = Query(ExportFormatEnum.ndjson),
+    principal: Principal = Depends(authenticate_doctor_or_patient),
+    db: Session = Depends(get_db)
+):
+    data = appointments.export_appointments(
+        db=db,
+        search=search,
+        sort_by=sort_by,
+        order=order,
+        status=status,
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        export_format=format
+    )
+    return StreamingResponse(
+        data,
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=appointments.{format.value}"}
+    )
+
+
 @router.get(
     "/appointments/{appointment_id}",
     response_model=schemas.Appointment,
@@ -539,15 +674,9 @@ def check_appointment(
 )
 def get_appointment(
     appointment_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
-    db: Session = Depends(get_db),
-    is_doctor: bool = True
+    principal: Principal = Depends(authenticate_doctor_or_patient),
+    db: Session = Depends(get_db)
 ):
-    if is_doctor:
-        doctors.verify_token(db, token)
-    else:
-        patients.verify_token(db, token)
-
     data = appointments.get_appintment(db=db, appointment_id=appointment_id)
     return data
 
@@ -560,10 +689,9 @@ def get_appointment(
 def update_appointment(
     appointment: schemas.AppointmentUpdate,
     appointment_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db)
 ):
-    patients.verify_token(db, token)
     data = appointments.update_appointment(db=db, appointment=appointment, appointment_id=appointment_id)
     return data
 
@@ -576,16 +704,10 @@ def update_appointment(
 def update_appointment_status(
     status: StatusEnum,
     appointment_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
-    db: Session = Depends(get_db),
-    is_doctor: bool = True
+    principal: Principal = Depends(authenticate_doctor_or_patient),
+    db: Session = Depends(get_db)
 ):
-    if is_doctor:
-        db_user = doctors.verify_token(db, token)
-    else:
-        db_user = patients.verify_token(db, token)
-    
-    data = appointments.update_appointment_status(db, appointment_id, status, db_user.id)
+    data = appointments.update_appointment_status(db, appointment_id, status, principal.id)
     return data
 
 
@@ -596,9 +718,32 @@ def update_appointment_status(
 )
 def delete_appointment(
     appointment_id: str = Path(..., min_length=36, max_length=36),
-    token: str = Header(None),
+    principal: Principal = Depends(authenticate("patient")),
     db: Session = Depends(get_db),
 ):
-    patients.verify_token(db, token)
     appointments.delete_appointment(db=db, appointment_id=appointment_id)
     return Response(status_code=status.HTTP_200_OK)
+
+
+# End Appointments
+
+# Analytics
+
+
+@router.get(
+    "/analytics/doctors/daily",
+    response_model=List[schemas.DoctorDailyStat],
+    tags=["Analytics"]
+)
+def get_doctor_daily_stats(
+    from_date: date,
+    to_date: date,
+    doctor_id: str = Query("all", min_length=3, max_length=36),
+    principal: Principal = Depends(authenticate("admin")),
+    db: Session = Depends(get_db)
+):
+    data = stats.get_doctor_daily_stats(db, from_date, to_date, doctor_id)
+    return data
+
+
+# End Analytics
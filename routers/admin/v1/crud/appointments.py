@@ -1,24 +1,175 @@
-from datetime import datetime
+import hashlib
 
-from sqlalchemy import and_, or_
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
 from fastapi import HTTPException, status
 
-from libs.utils import generate_id, now, object_as_dict
-from routers.admin.v1.crud.doctors import get_doctor, get_doctor_by_id
-from routers.admin.v1.crud.patients import get_patient, get_patient_by_id
-from models import AppointmentModel, StatusEnum
-from routers.admin.v1.schemas import AppointmentAdd, AppointmentUpdate
+from config import config
+from libs.export import ExportFormatEnum, stream_rows
+from libs.ical import stream_calendar
+from libs.intervals import Interval, IntervalIndex
+from libs.pagination import CountStrategyEnum, invalidate_counts, paginate, table_version
+from libs.search import fulltext_relevance
+from libs.utils import commit_loaded, eager_load, generate_id, is_duplicate_key, now, object_as_dict
+from routers.admin.v1.crud.doctors import DOCTOR_RESPONSE, DOCTOR_SORT_COLUMNS, get_doctor, get_doctors_by_ids, lock_doctor
+from routers.admin.v1.crud.patients import get_patient, get_patients_by_ids
+from routers.admin.v1.crud.specializations import get_specialization
+from routers.admin.v1.crud.slots import get_booked_slots, release_slots, reserve_slots
+from routers.admin.v1.crud.stats import AppointmentStat, get_appointment_stat, record_stats
+from models import AppointmentModel, DoctorModel, DoctorSpecializationModel, PatientModel, StatusEnum
+from routers.admin.v1.schemas import AppointmentAdd, AppointmentBulkAdd, AppointmentUpdate, BulkModeEnum, DoctorResponse, Patient
+
+
+ACTIVE_STATUSES = [StatusEnum.Created, StatusEnum.Rescheduled]
+
+# Relationships serialized by schemas.Appointment
+APPOINTMENT_RESPONSE = (AppointmentModel.patient, AppointmentModel.doctor)
+
+APPOINTMENT_SORT_COLUMNS = {
+    "from_time": AppointmentModel.from_time,
+    "to_time": AppointmentModel.to_time,
+    "status": AppointmentModel.status,
+}
+
+APPOINTMENT_EXPORT_COLUMNS = [
+    AppointmentModel.id,
+    AppointmentModel.patient_id,
+    AppointmentModel.doctor_id,
+    AppointmentModel.from_time,
+    AppointmentModel.to_time,
+    AppointmentModel.status,
+    AppointmentModel.canceller_id,
+    AppointmentModel.description,
+    AppointmentModel.created_at,
+    AppointmentModel.updated_at,
+]
+
+# Calendar owner -> (owner column, counterpart model, counterpart column)
+CALENDAR_OWNERS = {
+    "doctor": (AppointmentModel.doctor_id, PatientModel, AppointmentModel.patient_id),
+    "patient": (AppointmentModel.patient_id, DoctorModel, AppointmentModel.doctor_id),
+}
+
+# Booked intervals per doctor, only safe while a single worker serves writes
+appointment_index = IntervalIndex() if config.get("appointment_index", False) else None
+
+# "slots" books through the appointment_slots unique key instead of the locked range check
+SLOT_ENGINE = config.get("booking_engine", "range") == "slots"
+
+
+def get_appointment_by_id(db: Session, id: str, relationships: tuple = (), for_update: bool = False):
+    """
+    Primary key lookup, answered from the identity map when this request already loaded the row
+    - `for_update` locks the appointment row and re-reads it, write paths compute
+      the stats delta from the committed values, not from a stale read
+    """
+    if for_update:
+        db_appointment = db.get(
+            AppointmentModel,
+            id,
+            options=eager_load(*relationships),
+            populate_existing=True,
+            with_for_update={"of": AppointmentModel},
+        )
+    else:
+        db_appointment = db.get(AppointmentModel, id, options=eager_load(*relationships))
+    if db_appointment is None or db_appointment.is_deleted:
+        return None
+    return db_appointment
+
+
+def load_doctor_intervals(db: Session, doctor_id: str):
+    version = appointment_index.version(doctor_id)
+    rows = (
+        db.query(AppointmentModel.from_time, AppointmentModel.to_time, AppointmentModel.id)
+        .filter(
+            AppointmentModel.is_deleted == False,
+            AppointmentModel.status.in_(ACTIVE_STATUSES),
+            AppointmentModel.doctor_id == doctor_id,
+        )
+        .all()
+    )
+    return appointment_index.load(doctor_id, [Interval(*row) for row in rows], version)
 
 
-def get_appointment_by_id(db: Session, id: str):
-    return db.query(AppointmentModel).filter(AppointmentModel.is_deleted == False).first()
+def sync_appointment_index(db_appointment: AppointmentModel, previous_doctor_id: str = None):
+    if appointment_index is None:
+        return
+    if previous_doctor_id and previous_doctor_id != db_appointment.doctor_id:
+        appointment_index.remove(previous_doctor_id, db_appointment.id)
+    appointment_index.remove(db_appointment.doctor_id, db_appointment.id)
+    if not db_appointment.is_deleted and db_appointment.status in ACTIVE_STATUSES:
+        # The sorted lists only hold naive times truncated to the second, as loaded from the table
+        appointment_index.add(
+            db_appointment.doctor_id,
+            Interval(
+                db_appointment.from_time.replace(tzinfo=None, microsecond=0),
+                db_appointment.to_time.replace(tzinfo=None, microsecond=0),
+                db_appointment.id,
+            )
+        )
 
 
-def check_doctor_availibility(db: Session, from_time: str, to_time: str, doctor_id: str):
+def reserve_appointment_slots(db: Session, doctor_id: str, intervals: list):
+    try:
+        reserve_slots(db=db, doctor_id=doctor_id, intervals=intervals)
+    except IntegrityError as e:
+        db.rollback()
+        if not is_duplicate_key(e):
+            raise
+        raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
+
+
+def attach_cancellers(db: Session, db_appointments: list):
+    canceller_ids = {db_appointment.canceller_id for db_appointment in db_appointments if db_appointment.canceller_id}
+    if not canceller_ids:
+        return db_appointments
+
+    # Cancellers are usually the appointment's own patient or doctor, already in the identity map
+    cancellers = {}
+    for model in (PatientModel, DoctorModel):
+        for canceller_id in canceller_ids:
+            instance = db.identity_map.get(identity_key(model, canceller_id))
+            if instance is not None:
+                cancellers[canceller_id] = instance
+
+    # A canceller is either a patient or a doctor, resolve the rest in two queries at most
+    patient_ids = canceller_ids - cancellers.keys()
+    if patient_ids:
+        cancellers.update({db_patient.id: db_patient for db_patient in get_patients_by_ids(db=db, ids=list(patient_ids))})
+    doctor_ids = canceller_ids - cancellers.keys()
+    if doctor_ids:
+        cancellers.update({db_doctor.id: db_doctor for db_doctor in get_doctors_by_ids(db=db, ids=list(doctor_ids))})
+
+    for db_appointment in db_appointments:
+        if db_appointment.canceller_id:
+            db_appointment.canceller = cancellers.get(db_appointment.canceller_id)
+    return db_appointments
+
+
+def check_doctor_availibility(db: Session, from_time: str, to_time: str, doctor_id: str, for_update: bool = False):
+    """
+    Active appointments of the doctor overlapping the given time
+    - `for_update` is used under the doctor lock, it skips the in-memory index
+      and reads the latest committed rows with a locking read
+    """
     from_time = from_time.replace(tzinfo=None, microsecond=0)
     to_time = to_time.replace(tzinfo=None, microsecond=0)
-    db_appointment = (
+    if SLOT_ENGINE and not for_update:
+        return get_booked_slots(db=db, doctor_id=doctor_id, from_time=from_time, to_time=to_time)
+
+    if appointment_index is not None and not for_update:
+        intervals = appointment_index.overlapping(doctor_id, from_time, to_time)
+        if intervals is None and load_doctor_intervals(db, doctor_id):
+            intervals = appointment_index.overlapping(doctor_id, from_time, to_time)
+        if intervals is not None:
+            return intervals
+
+    query = (
         db.query(AppointmentModel)
         .filter(
             AppointmentModel.is_deleted == False,
@@ -29,23 +180,22 @@ def check_doctor_availibility(db: Session, from_time: str, to_time: str, doctor_
                 AppointmentModel.to_time >= from_time
             )
         )
-        .all()
     )
+    if for_update:
+        query = query.with_for_update(read=True)
+    db_appointment = query.all()
     return db_appointment
 
 
-def get_appointment_list(
+def filter_appointments(
     db: Session,
-    start: int,
-    limit: int,
+    query,
     search: str,
-    sort_by: str,
-    order: str,
     status: StatusEnum,
     patient_id: str,
     doctor_id: str,
 ):
-    query = db.query(AppointmentModel).filter(AppointmentModel.is_deleted == False)
+    query = query.filter(AppointmentModel.is_deleted == False)
 
     if status:
         query = query.filter(AppointmentModel.status == status.value)
@@ -56,62 +206,124 @@ def get_appointment_list(
     if doctor_id != "all":
         query = query.filter(AppointmentModel.doctor_id == doctor_id)
 
+    relevance = None
     if search != "all":
-        text = f"""%{search}%"""
-        query = query.filter(
-            AppointmentModel.description.like(text)
-        )
-    
-    if sort_by == "from_time":
-        if order == "desc":
-            query = query.order_by(AppointmentModel.from_time.desc())
+        relevance = fulltext_relevance(db, [AppointmentModel.description], search)
+        if relevance is not None:
+            query = query.filter(relevance > 0)
         else:
-            query = query.order_by(AppointmentModel.from_time)
-    
-    elif sort_by == "to_time":
-        if order == "desc":
-            query = query.order_by(AppointmentModel.to_time.desc())
-        else:
-            query = query.order_by(AppointmentModel.to_time)
-    
-    elif sort_by == "status":
-        if order == "desc":
-            query = query.order_by(AppointmentModel.status.desc())
-        else:
-            query = query.order_by(AppointmentModel.status)
-    
-    else:
-        query = query.order_by(AppointmentModel.created_at.desc())
-    
+            text = f"""%{search}%"""
+            query = query.filter(
+                AppointmentModel.description.like(text)
+            )
+    return query, relevance
 
-    count = query.count()
-    results = query.offset(start).limit(limit).all()
-    for result in results:
-        if result.canceller_id:
-            if db_patient := get_patient_by_id(db=db, id=result.canceller_id):
-                result.canceller = db_patient
-            else:
-                result.canceller = get_doctor_by_id(db=db, id=result.canceller_id)
 
-    data = {"count": count, "list": results}
+def get_appointment_sort(sort_by: str, order: str, relevance):
+    sort_column = APPOINTMENT_SORT_COLUMNS.get(sort_by)
+    if sort_by == "relevance" and relevance is not None:
+        return sort_by, relevance, order != "asc"
+    if sort_column is None:
+        return "created_at", AppointmentModel.created_at, True
+    return sort_by, sort_column, order == "desc"
+
+
+def get_appointment_list(
+    db: Session,
+    start: int,
+    limit: int,
+    search: str,
+    sort_by: str,
+    order: str,
+    status: StatusEnum,
+    patient_id: str,
+    doctor_id: str,
+    cursor: str = None,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
+):
+    query, relevance = filter_appointments(
+        db=db,
+        query=db.query(AppointmentModel).options(*eager_load(*APPOINTMENT_RESPONSE)),
+        search=search,
+        status=status,
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+    )
+    sort_by, sort_column, descending = get_appointment_sort(sort_by, order, relevance)
+
+    data = paginate(
+        query,
+        start=start,
+        limit=limit,
+        cursor=cursor,
+        sort_by=sort_by,
+        sort_column=sort_column,
+        descending=descending,
+        id_column=AppointmentModel.id,
+        count_strategy=count_strategy,
+        count_key=("appointments", search, status, patient_id, doctor_id),
+    )
+    results = data["list"]
+    attach_cancellers(db=db, db_appointments=results)
     return data
 
 
+def export_appointments(
+    db: Session,
+    search: str,
+    sort_by: str,
+    order: str,
+    status: StatusEnum,
+    patient_id: str,
+    doctor_id: str,
+    export_format: ExportFormatEnum,
+):
+    """
+    Same filters and order as get_appointment_list, streamed as text chunks
+    - yield_per makes PyMySQL use an unbuffered server-side cursor
+    """
+    query, relevance = filter_appointments(
+        db=db,
+        query=db.query(*APPOINTMENT_EXPORT_COLUMNS),
+        search=search,
+        status=status,
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+    )
+    sort_by, sort_column, descending = get_appointment_sort(sort_by, order, relevance)
+    if descending:
+        query = query.order_by(sort_column.desc(), AppointmentModel.id.desc())
+    else:
+        query = query.order_by(sort_column, AppointmentModel.id)
+
+    chunk_size = config.get("export_chunk_size", 1000)
+    return stream_rows(
+        query.yield_per(chunk_size),
+        fields=[column.key for column in APPOINTMENT_EXPORT_COLUMNS],
+        export_format=export_format,
+        chunk_size=chunk_size,
+    )
+
+
 def add_appointment(db: Session, appointment: AppointmentAdd):
     get_patient(db=db, patient_id=appointment.patient_id)
-    get_doctor(db=db, doctor_id=appointment.doctor_id)
 
     if appointment.from_time >= appointment.to_time:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from time is greater than to time")
 
-    is_appointment = check_doctor_availibility(
-        db=db,
-        from_time=appointment.from_time,
-        to_time=appointment.to_time,
-        doctor_id=appointment.doctor_id
-    )
-    if is_appointment:
-        raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
+    if SLOT_ENGINE:
+        get_doctor(db=db, doctor_id=appointment.doctor_id)
+    else:
+        lock_doctor(db=db, doctor_id=appointment.doctor_id)
+        is_appointment = check_doctor_availibility(
+            db=db,
+            from_time=appointment.from_time,
+            to_time=appointment.to_time,
+            doctor_id=appointment.doctor_id,
+            for_update=True
+        )
+        if is_appointment:
+            raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
     
     db_appointment = AppointmentModel(
         id=generate_id(),
@@ -119,12 +331,234 @@ def add_appointment(db: Session, appointment: AppointmentAdd):
         **appointment.dict()
     )
     db.add(db_appointment)
+    if SLOT_ENGINE:
+        db.flush()
+        reserve_appointment_slots(
+            db=db,
+            doctor_id=db_appointment.doctor_id,
+            intervals=[Interval(db_appointment.from_time, db_appointment.to_time, db_appointment.id)]
+        )
+    record_stats(db=db, added=[get_appointment_stat(db_appointment)])
     db.commit()
     db.refresh(db_appointment)
+    sync_appointment_index(db_appointment)
+    invalidate_counts("appointments")
     return db_appointment
 
 
 
+def get_bulk_intervals(appointment: AppointmentBulkAdd):
+    intervals = [(slot.from_time, slot.to_time) for slot in appointment.slots]
+    if appointment.recurrence:
+        recurrence = appointment.recurrence
+        for occurrence in range(recurrence.occurrences):
+            shift = timedelta(days=recurrence.interval_days * occurrence)
+            intervals.append((recurrence.from_time + shift, recurrence.to_time + shift))
+
+    intervals = [
+        (from_time.replace(tzinfo=None, microsecond=0), to_time.replace(tzinfo=None, microsecond=0))
+        for from_time, to_time in intervals
+    ]
+    if not intervals:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No appointment slots given")
+    max_items = config.get("bulk_booking_limit", 100)
+    if len(intervals) > max_items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"More than {max_items} appointments in one booking")
+    if any(from_time >= to_time for from_time, to_time in intervals):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from time is greater than to time")
+    return sorted(intervals)
+
+
+def add_appointments_bulk(db: Session, appointment: AppointmentBulkAdd):
+    db_patient = get_patient(db=db, patient_id=appointment.patient_id)
+    intervals = get_bulk_intervals(appointment)
+    db_doctor = lock_doctor(db=db, doctor_id=appointment.doctor_id)
+
+    # Existing bookings that overlap any requested interval, in one locking query
+    booked = (
+        db.query(AppointmentModel.from_time, AppointmentModel.to_time)
+        .filter(
+            AppointmentModel.is_deleted == False,
+            AppointmentModel.status.in_(ACTIVE_STATUSES),
+            AppointmentModel.doctor_id == appointment.doctor_id,
+            or_(*[
+                and_(AppointmentModel.from_time <= to_time, AppointmentModel.to_time >= from_time)
+                for from_time, to_time in intervals
+            ])
+        )
+        .with_for_update(read=True)
+        .all()
+    )
+
+    # Intervals are sorted by start, so one overlaps an accepted interval
+    # exactly when it starts before the latest accepted end
+    accepted, conflicts = [], []
+    accepted_until = None
+    for from_time, to_time in intervals:
+        is_booked = any(record.from_time <= to_time and record.to_time >= from_time for record in booked)
+        if is_booked or (accepted_until is not None and accepted_until >= from_time):
+            conflicts.append({"from_time": from_time, "to_time": to_time})
+            continue
+        accepted.append((from_time, to_time))
+        accepted_until = to_time if accepted_until is None else max(accepted_until, to_time)
+
+    if conflicts and appointment.mode == BulkModeEnum.all_or_nothing:
+        records = ""
+        for no, record in enumerate(conflicts, start=1):
+            records += f"{no}. {record['from_time']} To {record['to_time']} | "
+        raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail=f"already booked sloats: {records}")
+    if not accepted:
+        return {"created": [], "conflicts": conflicts}
+
+    created_at = now()
+    rows = [
+        {
+            "id": generate_id(),
+            "patient_id": appointment.patient_id,
+            "doctor_id": appointment.doctor_id,
+            "from_time": from_time,
+            "to_time": to_time,
+            "status": StatusEnum.Created,
+            "description": appointment.description,
+            "is_deleted": False,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+        for from_time, to_time in accepted
+    ]
+    # Serialize before commit expires the loaded patient and doctor
+    patient = Patient.from_orm(db_patient)
+    doctor = DoctorResponse.from_orm(db_doctor)
+
+    db.execute(AppointmentModel.__table__.insert().values(rows))
+    if SLOT_ENGINE:
+        reserve_appointment_slots(
+            db=db,
+            doctor_id=appointment.doctor_id,
+            intervals=[Interval(row["from_time"], row["to_time"], row["id"]) for row in rows]
+        )
+    record_stats(
+        db=db,
+        added=[AppointmentStat(row["doctor_id"], row["from_time"], row["to_time"], row["status"]) for row in rows]
+    )
+    db.commit()
+
+    if appointment_index is not None:
+        for row in rows:
+            appointment_index.add(row["doctor_id"], Interval(row["from_time"], row["to_time"], row["id"]))
+    invalidate_counts("appointments")
+
+    created = [dict(row, patient=patient, doctor=doctor) for row in rows]
+    return {"created": created, "conflicts": conflicts}
+
+
+def complete_expired_appointments(db: Session, batch_size: int):
+    """
+    Move active appointments whose to_time has passed to Complete
+    - One set-based UPDATE and commit per `batch_size` rows
+    - Rows are claimed with FOR UPDATE SKIP LOCKED, so concurrent sweepers split
+      the work instead of waiting on each other
+    """
+    cutoff = now()
+    total = 0
+    while True:
+        rows = (
+            db.query(
+                AppointmentModel.id,
+                AppointmentModel.doctor_id,
+                AppointmentModel.from_time,
+                AppointmentModel.to_time,
+                AppointmentModel.status,
+            )
+            .filter(
+                AppointmentModel.is_deleted == False,
+                AppointmentModel.status.in_(ACTIVE_STATUSES),
+                AppointmentModel.to_time < cutoff,
+            )
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        (
+            db.query(AppointmentModel)
+            .filter(AppointmentModel.id.in_(ids))
+            .update(
+                {AppointmentModel.status: StatusEnum.Complete, AppointmentModel.updated_at: cutoff},
+                synchronize_session=False
+            )
+        )
+        if SLOT_ENGINE:
+            release_slots(db=db, appointment_ids=ids)
+        record_stats(
+            db=db,
+            removed=[AppointmentStat(row.doctor_id, row.from_time, row.to_time, row.status) for row in rows],
+            added=[AppointmentStat(row.doctor_id, row.from_time, row.to_time, StatusEnum.Complete) for row in rows],
+        )
+        db.commit()
+
+        if appointment_index is not None:
+            for row in rows:
+                appointment_index.remove(row.doctor_id, row.id)
+        invalidate_counts("appointments")
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    return total
+
+
+def get_calendar_version(db: Session, owner: str, owner_id: str):
+    """
+    ETag and Last-Modified of an owner's calendar from one aggregate query
+    - Deleted rows are included, a soft delete bumps updated_at too
+    """
+    owner_column = CALENDAR_OWNERS[owner][0]
+    updated_at, count = (
+        db.query(func.max(AppointmentModel.updated_at), func.count(AppointmentModel.id))
+        .filter(owner_column == owner_id)
+        .one()
+    )
+    version = f"{owner}:{owner_id}:{updated_at}:{count}"
+    etag = 'W/"%s"' % hashlib.sha1(version.encode("utf-8")).hexdigest()
+    return etag, updated_at
+
+
+def get_calendar(db: Session, owner: str, owner_id: str, name: str):
+    owner_column, counterpart_model, counterpart_column = CALENDAR_OWNERS[owner]
+    chunk_size = config.get("export_chunk_size", 1000)
+    rows = (
+        db.query(
+            AppointmentModel.id,
+            AppointmentModel.from_time,
+            AppointmentModel.to_time,
+            AppointmentModel.status,
+            AppointmentModel.description,
+            AppointmentModel.updated_at,
+            counterpart_model.first_name,
+            counterpart_model.last_name,
+        )
+        .outerjoin(counterpart_model, counterpart_model.id == counterpart_column)
+        .filter(owner_column == owner_id, AppointmentModel.is_deleted == False)
+        .order_by(AppointmentModel.from_time, AppointmentModel.id)
+        .yield_per(chunk_size)
+    )
+    events = (
+        {
+            "uid": f"{id}@appointments",
+            "stamp": updated_at,
+            "start": from_time,
+            "end": to_time,
+            "status": "CANCELLED" if appointment_status == StatusEnum.Canceled else "CONFIRMED",
+            "summary": " ".join(["Appointment with", first_name or "", last_name or ""]).strip(),
+            "description": description,
+        }
+        for id, from_time, to_time, appointment_status, description, updated_at, first_name, last_name in rows
+    )
+    return stream_calendar(name=name, events=events, chunk_size=chunk_size)
+
+
 def check_appointment(db: Session, from_time: datetime, to_time: datetime, doctor_id: str):
     db_appointment = check_doctor_availibility(db, from_time=from_time, to_time=to_time, doctor_id=doctor_id)
     if db_appointment:
@@ -135,69 +569,230 @@ def check_appointment(db: Session, from_time: datetime, to_time: datetime, docto
     return True
 
 
+def get_free_slots(db: Session, from_time: datetime, to_time: datetime, doctor_id: str, slot_minutes: int):
+    from_time = from_time.replace(tzinfo=None, microsecond=0)
+    to_time = to_time.replace(tzinfo=None, microsecond=0)
+    if from_time >= to_time:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from time is greater than to time")
+    max_days = config.get("free_slot_max_days", 180)
+    if to_time - from_time > timedelta(days=max_days):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"date range is longer than {max_days} days")
+
+    booked = (
+        db.query(AppointmentModel.from_time, AppointmentModel.to_time)
+        .filter(
+            AppointmentModel.is_deleted == False,
+            AppointmentModel.status.in_(ACTIVE_STATUSES),
+            AppointmentModel.doctor_id == doctor_id,
+            AppointmentModel.from_time <= to_time,
+            AppointmentModel.to_time >= from_time,
+        )
+        .order_by(AppointmentModel.from_time)
+        .all()
+    )
+
+    # Sweep slots and bookings together, busy_until is the latest end of every
+    # booking that starts before the current slot ends
+    slot = timedelta(minutes=slot_minutes)
+    free_slots = []
+    position = 0
+    busy_until = None
+    slot_start = from_time
+    while slot_start + slot <= to_time:
+        slot_end = slot_start + slot
+        while position < len(booked) and booked[position].from_time <= slot_end:
+            if busy_until is None or booked[position].to_time > busy_until:
+                busy_until = booked[position].to_time
+            position += 1
+        if busy_until is None or busy_until < slot_start:
+            free_slots.append({"from_time": slot_start, "to_time": slot_end})
+        slot_start = slot_end
+    return free_slots
+
+
+def get_available_doctors(
+    db: Session,
+    specialization_id: str,
+    from_time: datetime,
+    to_time: datetime,
+    start: int,
+    limit: int,
+    sort_by: str,
+    order: str,
+    cursor: str = None,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
+):
+    """
+    Doctors of a specialization with no active appointment overlapping the window
+    - Specialization membership is an EXISTS, a doctor linked twice is still listed once
+    - NOT EXISTS is correlated on doctor_id and served by ix_appointments_doctor_availability
+    - Overlap matches check_doctor_availibility, touching appointments count as busy
+    """
+    get_specialization(db=db, specialization_id=specialization_id)
+    from_time = from_time.replace(tzinfo=None, microsecond=0)
+    to_time = to_time.replace(tzinfo=None, microsecond=0)
+    if from_time >= to_time:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from time is greater than to time")
+
+    specialized = exists().where(
+        and_(
+            DoctorSpecializationModel.doctor_id == DoctorModel.id,
+            DoctorSpecializationModel.specialization_id == specialization_id,
+        )
+    )
+    busy = exists().where(
+        and_(
+            AppointmentModel.doctor_id == DoctorModel.id,
+            AppointmentModel.is_deleted == False,
+            AppointmentModel.status.in_(ACTIVE_STATUSES),
+            AppointmentModel.from_time <= to_time,
+            AppointmentModel.to_time >= from_time,
+        )
+    )
+    query = (
+        db.query(DoctorModel)
+        .options(*eager_load(*DOCTOR_RESPONSE))
+        .filter(
+            DoctorModel.is_deleted == False,
+            specialized,
+            ~busy,
+        )
+    )
+
+    sort_column = DOCTOR_SORT_COLUMNS.get(sort_by)
+    if sort_column is None:
+        sort_by, sort_column, descending = "created_at", DoctorModel.created_at, True
+    else:
+        descending = order == "desc"
+
+    data = paginate(
+        query,
+        start=start,
+        limit=limit,
+        cursor=cursor,
+        sort_by=sort_by,
+        sort_column=sort_column,
+        descending=descending,
+        id_column=DoctorModel.id,
+        count_strategy=count_strategy,
+        # Doctor writes change the specialization membership, so their version is part of the key
+        count_key=("appointments", table_version("doctors"), specialization_id, from_time, to_time),
+    )
+    return data
+
+
 def get_appintment(db: Session, appointment_id: str):
-    db_appointment = get_appointment_by_id(db=db, id=appointment_id)
+    db_appointment = get_appointment_by_id(db=db, id=appointment_id, relationships=APPOINTMENT_RESPONSE)
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment is not found")
     
-    if db_appointment.canceller_id:
-        if db_patient := get_patient_by_id(db=db, id=db_appointment.canceller_id):
-            db_appointment.canceller = db_patient
-        else:
-            db_appointment.canceller = get_doctor_by_id(db=db, id=db_appointment.canceller_id)
+    attach_cancellers(db=db, db_appointments=[db_appointment])
     return db_appointment
 
 
 def update_appointment(db: Session, appointment: AppointmentUpdate, appointment_id: str):
-    db_appointment = get_appointment_by_id(db=db, id=appointment_id)
+    # Doctor before appointment, the same lock order as booking
+    if SLOT_ENGINE:
+        get_doctor(db=db, doctor_id=appointment.doctor_id)
+    else:
+        lock_doctor(db=db, doctor_id=appointment.doctor_id)
+
+    db_appointment = get_appointment_by_id(db=db, id=appointment_id, relationships=APPOINTMENT_RESPONSE, for_update=True)
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment is not found")
     
     if db_appointment.status == StatusEnum.Canceled or db_appointment.status == StatusEnum.Complete:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="This Appoointment is closed please book new appointment")
     
-    get_doctor(db=db, doctor_id=appointment.doctor_id)
-    
-    is_appointment = check_doctor_availibility(
-        db=db,
-        from_time=appointment.from_time,
-        to_time=appointment.to_time,
-        doctor_id=appointment.doctor_id
-    )
-    if is_appointment:
-        raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
+    if not SLOT_ENGINE:
+        is_appointment = check_doctor_availibility(
+            db=db,
+            from_time=appointment.from_time,
+            to_time=appointment.to_time,
+            doctor_id=appointment.doctor_id,
+            for_update=True
+        )
+        if is_appointment:
+            raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
 
+    previous_doctor_id = db_appointment.doctor_id
+    previous_stat = get_appointment_stat(db_appointment)
     db_appointment.doctor_id = appointment.doctor_id
-    db_appointment.from_time = appointment.from_time
-    db_appointment.to_time = appointment.to_time
+    # Stored the way the database returns them, the instance is not refreshed after commit
+    db_appointment.from_time = appointment.from_time.replace(tzinfo=None, microsecond=0)
+    db_appointment.to_time = appointment.to_time.replace(tzinfo=None, microsecond=0)
     db_appointment.description = appointment.description
     db_appointment.updated_at = now()
-    db.commit()
-    db.refresh(db_appointment)
+    if SLOT_ENGINE:
+        release_slots(db=db, appointment_ids=[db_appointment.id])
+        reserve_appointment_slots(
+            db=db,
+            doctor_id=appointment.doctor_id,
+            intervals=[Interval(db_appointment.from_time, db_appointment.to_time, db_appointment.id)]
+        )
+    record_stats(db=db, removed=[previous_stat], added=[get_appointment_stat(db_appointment)])
+    commit_loaded(db)
+    if previous_doctor_id != db_appointment.doctor_id:
+        # Reloaded from the identity map, lock_doctor or get_doctor just fetched it
+        db.expire(db_appointment, ["doctor"])
+    sync_appointment_index(db_appointment, previous_doctor_id=previous_doctor_id)
+    invalidate_counts("appointments")
     return db_appointment
 
 
 def update_appointment_status(db: Session, appointment_id: str, appointment_status: StatusEnum, user_id: str):
-    db_appointment = get_appointment_by_id(db=db, id=appointment_id)
+    db_appointment = get_appointment_by_id(db=db, id=appointment_id, relationships=APPOINTMENT_RESPONSE, for_update=True)
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment is not found")
     
     if appointment_status == StatusEnum.Canceled:
         db_appointment.canceller_id = user_id
     
+    was_active = db_appointment.status in ACTIVE_STATUSES
+    if not SLOT_ENGINE and not was_active and appointment_status in ACTIVE_STATUSES:
+        # Reopening takes the time back, the slot engine checks it when reserving the slots below
+        lock_doctor(db=db, doctor_id=db_appointment.doctor_id)
+        is_appointment = check_doctor_availibility(
+            db=db,
+            from_time=db_appointment.from_time,
+            to_time=db_appointment.to_time,
+            doctor_id=db_appointment.doctor_id,
+            for_update=True
+        )
+        if is_appointment:
+            raise HTTPException(status_code=status.HTTP_208_ALREADY_REPORTED, detail="Appointment already booked on this time")
+
+    previous_stat = get_appointment_stat(db_appointment)
     db_appointment.status = appointment_status
     db_appointment.updated_at = now()
-    db.commit()
-    db.refresh(db_appointment)
-    return get_appintment(db=db, appointment_id=appointment_id)
+    if SLOT_ENGINE and was_active and appointment_status not in ACTIVE_STATUSES:
+        release_slots(db=db, appointment_ids=[db_appointment.id])
+    elif SLOT_ENGINE and not was_active and appointment_status in ACTIVE_STATUSES:
+        reserve_appointment_slots(
+            db=db,
+            doctor_id=db_appointment.doctor_id,
+            intervals=[Interval(db_appointment.from_time, db_appointment.to_time, db_appointment.id)]
+        )
+    record_stats(db=db, removed=[previous_stat], added=[get_appointment_stat(db_appointment)])
+    commit_loaded(db)
+    sync_appointment_index(db_appointment)
+    invalidate_counts("appointments")
+    attach_cancellers(db=db, db_appointments=[db_appointment])
+    return db_appointment
 
 
 def delete_appointment(db: Session, appointment_id: str):
-    db_appointment = get_appointment_by_id(db=db, id=appointment_id)
+    db_appointment = get_appointment_by_id(db=db, id=appointment_id, for_update=True)
     if db_appointment is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Appointment is not found")
     
+    previous_stat = get_appointment_stat(db_appointment)
     db_appointment.is_deleted = True
     db_appointment.updated_at = now()
-    db.commit()
+    if SLOT_ENGINE:
+        release_slots(db=db, appointment_ids=[db_appointment.id])
+    record_stats(db=db, removed=[previous_stat])
+    commit_loaded(db)
+    sync_appointment_index(db_appointment)
+    invalidate_counts("appointments")
     return
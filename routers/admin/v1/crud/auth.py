@@ -0,0 +1,51 @@
+import traceback
+
+from collections import namedtuple
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from jwcrypto.common import JWException
+
+from libs.utils import decode_token, principal_cache
+from routers.admin.v1.crud.doctors import get_doctor_by_id
+from routers.admin.v1.crud.patients import get_patient_by_id
+from routers.admin.v1.crud.users import get_user_by_id
+
+
+Principal = namedtuple("Principal", ["role", "id"])
+
+
+def get_principal_by_id(db: Session, role: str, id: str):
+    if role == "doctor":
+        return get_doctor_by_id(db, id)
+    if role == "patient":
+        return get_patient_by_id(db, id)
+    db_user = get_user_by_id(db, id)
+    if db_user is None or db_user.is_deleted:
+        return None
+    return db_user
+
+
+def verify_token(db: Session, token: str, role: str):
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token."
+        )
+    try:
+        claims = decode_token(token)
+        if claims.get("role", role) != role:
+            raise ValueError("Token issued for another role")
+        principal = principal_cache.get((role, claims["id"]))
+        if principal is None and get_principal_by_id(db, role, claims["id"]):
+            principal = Principal(role=role, id=claims["id"])
+            principal_cache.set((role, principal.id), principal)
+    except (ValueError, JWException) as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token."
+        )
+    except Exception as e:
+        print(e)
+        print(traceback.format_exc())
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    if principal is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    return principal
@@ -1,22 +1,63 @@
-import json
-import bcrypt
 import traceback
 
 from sqlalchemy import or_
-from jwcrypto import jwk, jwt
 from sqlalchemy.orm import Session 
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
 from config import config
-from models import DoctorSpecializationModel, DoctorModel, DoctorSpecializationModel
+from models import DoctorSpecializationModel, DoctorModel, SpecializationModel
 from routers.admin.v1.crud.specializations import get_specialization
 from routers.admin.v1.schemas import ChangePassword, DoctorAdd, DoctorUpdate, SignIn
-from libs.utils import create_password, generate_id, get_token, now
-
+from libs.export import check_max_rows, iter_chunks, stream_json_array
+from libs.pagination import CountStrategyEnum, invalidate_counts, paginate
+from libs.search import fulltext_relevance
+from libs.utils import check_password, commit_loaded, eager_load, generate_id, get_token, hash_password, now, principal_cache, release_email, save_unique
+
+
+
+DOCTOR_SORT_COLUMNS = {
+    "first_name": DoctorModel.first_name,
+    "last_name": DoctorModel.last_name,
+    "eamil": DoctorModel.email,
+    "created_at": DoctorModel.created_at,
+}
+
+# Relationships serialized by schemas.Doctor, the nested doctor is the parent from the identity map
+DOCTOR_RESPONSE = ((DoctorModel.doctor_specializations, DoctorSpecializationModel.specialization),)
+
+DOCTOR_STREAM_COLUMNS = [
+    DoctorModel.id,
+    DoctorModel.first_name,
+    DoctorModel.last_name,
+    DoctorModel.email,
+    DoctorModel.number,
+]
+
+
+def get_doctor_by_id(db: Session, id: str, relationships: tuple = ()):
+    return (
+        db.query(DoctorModel)
+        .options(*eager_load(*relationships))
+        .filter(DoctorModel.id == id, DoctorModel.is_deleted == False)
+        .first()
+    )
 
+def lock_doctor(db: Session, doctor_id: str):
+    # The doctor row doubles as the booking lock, bookings for one doctor run one
+    # at a time until commit while other doctors are not blocked
+    db_doctor = (
+        db.query(DoctorModel)
+        .filter(DoctorModel.id == doctor_id, DoctorModel.is_deleted == False)
+        .with_for_update()
+        .first()
+    )
+    if db_doctor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="doctor is not found")
+    return db_doctor
 
-def get_doctor_by_id(db: Session, id: str):
-    return db.query(DoctorModel).filter(DoctorModel.id == id, DoctorModel.is_deleted == False).first()
+def get_doctors_by_ids(db: Session, ids: list):
+    return db.query(DoctorModel).filter(DoctorModel.id.in_(ids), DoctorModel.is_deleted == False).all()
 
 def get_doctor_by_email(db: Session, email: str):
     return db.query(DoctorModel).filter(DoctorModel.email == email, DoctorModel.is_deleted == False).first()
@@ -32,70 +73,64 @@ def get_doctors_list(
     limit: int,
     search: str,
     sort_by: str,
-    order: str
+    order: str,
+    cursor: str = None,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
 ):
-    query = db.query(DoctorModel).filter(DoctorModel.is_deleted == False)
+    query = db.query(DoctorModel).options(*eager_load(*DOCTOR_RESPONSE)).filter(DoctorModel.is_deleted == False)
 
+    relevance = None
     if search != "all":
-        text = f"""%{search}%"""
-        query = query.filter(
-            or_(
-                DoctorModel.first_name.like(text),
-                DoctorModel.last_name.like(text),
-                DoctorModel.email.like(text),
-                DoctorModel.number.like(text),
-            )
+        relevance = fulltext_relevance(
+            db, [DoctorModel.first_name, DoctorModel.last_name, DoctorModel.email, DoctorModel.number], search
         )
-    
-    if sort_by == "first_name":
-        if order == "desc":
-            query = query.order_by(DoctorModel.first_name.desc())
-        else:
-            query = query.order_by(DoctorModel.first_name)
-    elif sort_by == "last_name":
-        if order == "desc":
-            query = query.order_by(DoctorModel.last_name.desc())
-        else:
-            query = query.order_by(DoctorModel.last_name)
-    elif sort_by == "eamil":
-        if order == "desc":
-            query = query.order_by(DoctorModel.email.desc())
+        if relevance is not None:
+            query = query.filter(relevance > 0)
         else:
-            query = query.order_by(DoctorModel.email)
-    elif sort_by == "created_at":
-        if order == "desc":
-            query = query.order_by(DoctorModel.created_at.desc())
-        else:
-            query = query.order_by(DoctorModel.created_at)
-    else:
-        query = query.order_by(DoctorModel.created_at.desc())
+            text = f"""%{search}%"""
+            query = query.filter(
+                or_(
+                    DoctorModel.first_name.like(text),
+                    DoctorModel.last_name.like(text),
+                    DoctorModel.email.like(text),
+                    DoctorModel.number.like(text),
+                )
+            )
     
-    count = query.count()
-    results = query.offset(start).limit(limit).all()
-
-    data = {"count": count, "list": results}
+    sort_column = DOCTOR_SORT_COLUMNS.get(sort_by)
+    if sort_by == "relevance" and relevance is not None:
+        sort_column, descending = relevance, order != "asc"
+    elif sort_column is None:
+        sort_by, sort_column, descending = "created_at", DoctorModel.created_at, True
+    else:
+        descending = order == "desc"
+
+    data = paginate(
+        query,
+        start=start,
+        limit=limit,
+        cursor=cursor,
+        sort_by=sort_by,
+        sort_column=sort_column,
+        descending=descending,
+        id_column=DoctorModel.id,
+        count_strategy=count_strategy,
+        count_key=("doctors", search),
+    )
     return data
 
 
-def add_doctor(db: Session, doctor:DoctorAdd):
-    db_doctor = get_doctor_by_email(db=db, email=doctor.email)
-    if db_doctor:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="doctor already exist"
-        )
+async def add_doctor(db: Session, doctor:DoctorAdd):
     specialization_id = doctor.specialization_id
     del doctor.specialization_id
-    doctor.password = create_password(doctor.password)
+    await run_in_threadpool(get_specialization, db=db, specialization_id=specialization_id)
+
+    doctor.password = await hash_password(doctor.password)
     db_doctor = DoctorModel(
         id=generate_id(),
         **doctor.dict()
     )
     db.add(db_doctor)
-
-    get_specialization(db=db, specialization_id=specialization_id)
-    db_doctor_spec = get_doctor_specialization(db=db, doctor_id=db_doctor.id, specialization_id=specialization_id)
-    if db_doctor_spec:
-        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Already added")
     
     db_doctor_spec = DoctorSpecializationModel(
         id=generate_id(),
@@ -103,9 +138,9 @@ def add_doctor(db: Session, doctor:DoctorAdd):
         specialization_id=specialization_id
     )
     db.add(db_doctor_spec)
-    db.commit()
-    db.refresh(db_doctor)
-    db_doctor.token = get_token(db_doctor.id, db_doctor.email)
+    await run_in_threadpool(save_unique, db, db_doctor, "doctor already exist")
+    invalidate_counts("doctors")
+    db_doctor.token = get_token(db_doctor.id, db_doctor.email, "doctor")
     return db_doctor
 
 
@@ -120,6 +155,8 @@ def add_doctor_specialization(db: Session, doctor_id: str, specialization_id: st
     )
     db.add(db_doctor_spec)
     db.commit()
+    # Specialization membership is part of the doctors counts, e.g. available doctors
+    invalidate_counts("doctors")
     db.refresh(db_doctor_spec)
     return db_doctor_spec
 
@@ -130,28 +167,30 @@ def delete_doctor_specialization(db: Session, doctor_id: str, specialization_id:
     if record:
         db.delete(record)
         db.commit()
+        invalidate_counts("doctors")
     return
 
 
-def sign_in(db: Session, doctor: SignIn):
-    db_doctor = get_doctor_by_email(db=db, email=doctor.email)
+async def sign_in(db: Session, doctor: SignIn):
+    db_doctor = await run_in_threadpool(get_doctor_by_email, db=db, email=doctor.email)
     if db_doctor is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    hashed = db_doctor.password
-    hashed = bytes(hashed, "utf-8")
-    password = bytes(doctor.password, "utf-8")
-    if not bcrypt.checkpw(password, hashed):
+    if not await check_password(doctor.password, db_doctor.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    db_doctor.token = get_token(db_doctor.id, db_doctor.email)
+    db_doctor.token = get_token(db_doctor.id, db_doctor.email, "doctor")
     return db_doctor
 
 
-def change_password(db: Session, user: ChangePassword, token: str):
-    db_doctor = verify_token(db, token=token)
+async def change_password(db: Session, user: ChangePassword, doctor_id: str):
+    db_doctor = await run_in_threadpool(get_doctor_by_id, db, id=doctor_id)
+    if db_doctor is None:
+        # The principal came from a cache entry that outlived the row
+        principal_cache.pop(("doctor", doctor_id))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     try:
-        hashed = bytes(db_doctor.password, "utf-8")
-        password = bytes(user.old_password, "utf-8")
-        result = bcrypt.checkpw(password, hashed)
+        result = await check_password(user.old_password, db_doctor.password)
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         print(traceback.format_exc())
@@ -161,26 +200,76 @@ def change_password(db: Session, user: ChangePassword, token: str):
             status_code=status.HTTP_403_FORBIDDEN, detail="Incorrect old password"
         )
     else:
-        password = create_password(user.new_password)
+        password = await hash_password(user.new_password)
         db_doctor.password = password
         db_doctor.updated_at = now()
-        db.commit()
+        await run_in_threadpool(db.commit)
+        principal_cache.pop(("doctor", doctor_id))
 
 
-def get_doctor(db: Session, doctor_id: str):
-    db_doctor = get_doctor_by_id(db=db, id=doctor_id)
+def get_doctor(db: Session, doctor_id: str, relationships: tuple = ()):
+    db_doctor = get_doctor_by_id(db=db, id=doctor_id, relationships=relationships)
     if db_doctor is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="doctor is not found")
     return db_doctor
 
 
 def get_all_doctors(db: Session):
-    db_doctor = db.query(DoctorModel).filter(DoctorModel.is_deleted == False).all()
+    query = db.query(DoctorModel).filter(DoctorModel.is_deleted == False)
+    max_rows = config.get("all_max_rows", 5000)
+    check_max_rows(query.count(), max_rows, f"More than {max_rows} doctors, use stream=true or the paginated list")
+    db_doctor = query.options(*eager_load(*DOCTOR_RESPONSE)).all()
     return db_doctor
 
 
+def get_doctor_specialization_items(db: Session, doctor_ids: list):
+    rows = (
+        db.query(
+            DoctorSpecializationModel.doctor_id,
+            DoctorSpecializationModel.id,
+            SpecializationModel.id,
+            SpecializationModel.name,
+            SpecializationModel.description,
+        )
+        .join(SpecializationModel, SpecializationModel.id == DoctorSpecializationModel.specialization_id)
+        .filter(DoctorSpecializationModel.doctor_id.in_(doctor_ids))
+        .all()
+    )
+    items = {}
+    for doctor_id, id, specialization_id, name, description in rows:
+        items.setdefault(doctor_id, []).append(
+            {"id": id, "specialization": {"id": specialization_id, "name": name, "description": description}}
+        )
+    return items
+
+
+def get_doctor_chunk_items(db: Session, rows: list):
+    fields = [column.key for column in DOCTOR_STREAM_COLUMNS]
+    specializations = get_doctor_specialization_items(db=db, doctor_ids=[row.id for row in rows])
+    items = []
+    for row in rows:
+        doctor = dict(zip(fields, row))
+        # schemas.DoctorSpecialization repeats the doctor, the same dict serves both places
+        doctor_specializations = [dict(item, doctor=doctor) for item in specializations.get(row.id, [])]
+        items.append(dict(doctor, doctor_specializations=doctor_specializations))
+    return items
+
+
+def stream_all_doctors(db: Session):
+    """
+    get_all_doctors as a streamed JSON array of column-only rows
+    - Each chunk costs one doctors query and one specializations query
+    - Same shape as List[schemas.Doctor]
+    """
+    query = db.query(*DOCTOR_STREAM_COLUMNS).filter(DoctorModel.is_deleted == False)
+    max_rows = config.get("stream_max_rows", 100000)
+    check_max_rows(query.count(), max_rows, f"More than {max_rows} doctors, use the paginated list")
+    chunks = iter_chunks(query, DoctorModel.id, config.get("export_chunk_size", 1000))
+    return stream_json_array(get_doctor_chunk_items(db=db, rows=rows) for rows in chunks)
+
+
 def update_doctor(db: Session, doctor_id:str, doctor: DoctorUpdate):
-    db_doctor = get_doctor_by_id(db=db, id=doctor_id)
+    db_doctor = get_doctor_by_id(db=db, id=doctor_id, relationships=DOCTOR_RESPONSE)
     if db_doctor is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="doctor is not found")
     
@@ -188,8 +277,9 @@ def update_doctor(db: Session, doctor_id:str, doctor: DoctorUpdate):
     db_doctor.last_name = doctor.last_name
     db_doctor.number = doctor.number
     db_doctor.updated_at = now()
-    db.commit()
-    db.refresh(db_doctor)
+    commit_loaded(db)
+    principal_cache.pop(("doctor", doctor_id))
+    invalidate_counts("doctors")
     return db_doctor
 
 
@@ -199,32 +289,10 @@ def delete_doctor(db: Session, doctor_id:str):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="doctor is not found")
 
     db_doctor.is_deleted = True
+    # The unique index covers deleted rows, free the address for a new sign-up
+    db_doctor.email = release_email(DoctorModel.email, db_doctor.email, db_doctor.id)
     db_doctor.updated_at = now()
     db.commit()
+    principal_cache.pop(("doctor", doctor_id))
+    invalidate_counts("doctors")
     return db_doctor
-
-
-def verify_token(db: Session, token: str):
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token."
-        )
-    else:
-        try:
-            key = jwk.JWK(**config["jwt_key"])
-            ET = jwt.JWT(key=key, jwt=token)
-            ST = jwt.JWT(key=key, jwt=ET.claims)
-            claims = ST.claims
-            claims = json.loads(claims)
-            db_doctor = get_doctor_by_id(db, claims["id"])
-        except ValueError as e:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token."
-            )
-        except Exception as e:
-            print(e)
-            print(traceback.format_exc())
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if db_doctor is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        return db_doctor
\ No newline at end of file
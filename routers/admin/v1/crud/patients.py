@@ -1,21 +1,47 @@
-import json
 import traceback
 
-import bcrypt
 from sqlalchemy import or_
-from jwcrypto import jwk, jwt
 from sqlalchemy.orm import Session 
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
 from config import config
 from models import GenderEnum, PatientModel
 from routers.admin.v1.schemas import ChangePassword, PatientsAdd, PatientUpdate, SignIn
-from libs.utils import create_password, generate_id, get_token, now
+from libs.export import check_max_rows, iter_chunks, stream_json_array
+from libs.pagination import CountStrategyEnum, invalidate_counts, paginate
+from libs.search import fulltext_relevance
+from libs.utils import check_password, generate_id, get_token, hash_password, now, principal_cache, save_unique
+
+
+PATIENT_SORT_COLUMNS = {
+    "first_name": PatientModel.first_name,
+    "last_name": PatientModel.last_name,
+    "eamil": PatientModel.email,
+    "gender": PatientModel.gender,
+    "height": PatientModel.height,
+    "weight": PatientModel.weight,
+    "created_at": PatientModel.created_at,
+}
+
+PATIENT_STREAM_COLUMNS = [
+    PatientModel.id,
+    PatientModel.first_name,
+    PatientModel.last_name,
+    PatientModel.gender,
+    PatientModel.height,
+    PatientModel.weight,
+    PatientModel.email,
+    PatientModel.number,
+]
 
 
 def get_patient_by_id(db: Session, id: str):
     return db.query(PatientModel).filter(PatientModel.id == id).first()
 
+def get_patients_by_ids(db: Session, ids: list):
+    return db.query(PatientModel).filter(PatientModel.id.in_(ids)).all()
+
 def get_patient_by_email(db: Session, email: str):
     return db.query(PatientModel).filter(PatientModel.email == email).first()
 
@@ -27,105 +53,88 @@ def get_patients_list(
     search: str,
     sort_by: str,
     order: str,
-    gender: GenderEnum
+    gender: GenderEnum,
+    cursor: str = None,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
 ):
     query = db.query(PatientModel)
 
     if gender:
         query = query.filter(PatientModel.gender == gender.value)
     
+    relevance = None
     if search != "all":
-        text = f"""%{search}%"""
-        query = query.filter(
-            or_(
-                PatientModel.first_name.like(text),
-                PatientModel.last_name.like(text),
-                PatientModel.email.like(text),
-                PatientModel.number.like(text),
-            )
+        relevance = fulltext_relevance(
+            db, [PatientModel.first_name, PatientModel.last_name, PatientModel.email, PatientModel.number], search
         )
-    
-    if sort_by == "first_name":
-        if order == "desc":
-            query = query.order_by(PatientModel.first_name.desc())
-        else:
-            query = query.order_by(PatientModel.first_name)
-    elif sort_by == "last_name":
-        if order == "desc":
-            query = query.order_by(PatientModel.last_name.desc())
-        else:
-            query = query.order_by(PatientModel.last_name)
-    elif sort_by == "eamil":
-        if order == "desc":
-            query = query.order_by(PatientModel.email.desc())
-        else:
-            query = query.order_by(PatientModel.email)
-    elif sort_by == "gender":
-        if order == "desc":
-            query = query.order_by(PatientModel.gender.desc())
-        else:
-            query = query.order_by(PatientModel.gender)
-    elif sort_by == "height":
-        if order == "desc":
-            query = query.order_by(PatientModel.height.desc())
+        if relevance is not None:
+            query = query.filter(relevance > 0)
         else:
-            query = query.order_by(PatientModel.height)
-    elif sort_by == "weight":
-        if order == "desc":
-            query = query.order_by(PatientModel.weight.desc())
-        else:
-            query = query.order_by(PatientModel.weight)
-    elif sort_by == "created_at":
-        if order == "desc":
-            query = query.order_by(PatientModel.created_at.desc())
-        else:
-            query = query.order_by(PatientModel.created_at)
-    else:
-        query = query.order_by(PatientModel.created_at.desc())
+            text = f"""%{search}%"""
+            query = query.filter(
+                or_(
+                    PatientModel.first_name.like(text),
+                    PatientModel.last_name.like(text),
+                    PatientModel.email.like(text),
+                    PatientModel.number.like(text),
+                )
+            )
     
-    count = query.count()
-    results = query.offset(start).limit(limit).all()
-    data = {"count": count, "list": results}
+    sort_column = PATIENT_SORT_COLUMNS.get(sort_by)
+    if sort_by == "relevance" and relevance is not None:
+        sort_column, descending = relevance, order != "asc"
+    elif sort_column is None:
+        sort_by, sort_column, descending = "created_at", PatientModel.created_at, True
+    else:
+        descending = order == "desc"
+
+    data = paginate(
+        query,
+        start=start,
+        limit=limit,
+        cursor=cursor,
+        sort_by=sort_by,
+        sort_column=sort_column,
+        descending=descending,
+        id_column=PatientModel.id,
+        count_strategy=count_strategy,
+        count_key=("patients", search, gender),
+    )
     return data
 
 
-def add_patient(db: Session, patient:PatientsAdd):
-    db_patient = get_patient_by_email(db=db, email=patient.email)
-    if db_patient:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="patient already exist"
-        )
-    patient.password = create_password(patient.password)
+async def add_patient(db: Session, patient:PatientsAdd):
+    patient.password = await hash_password(patient.password)
     db_patient = PatientModel(
         id=generate_id(),
         **patient.dict()
     )
-    db.add(db_patient)
-    db.commit()
-    db.refresh(db_patient)
-    db_patient.token = get_token(db_patient.id, db_patient.email)
+    await run_in_threadpool(save_unique, db, db_patient, "patient already exist")
+    invalidate_counts("patients")
+    db_patient.token = get_token(db_patient.id, db_patient.email, "patient")
     return db_patient
 
 
-def sign_in(db: Session, patient: SignIn):
-    db_patient = get_patient_by_email(db=db, email=patient.email)
+async def sign_in(db: Session, patient: SignIn):
+    db_patient = await run_in_threadpool(get_patient_by_email, db=db, email=patient.email)
     if db_patient is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    hashed = db_patient.password
-    hashed = bytes(hashed, "utf-8")
-    password = bytes(patient.password, "utf-8")
-    if not bcrypt.checkpw(password, hashed):
+    if not await check_password(patient.password, db_patient.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    db_patient.token = get_token(db_patient.id, db_patient.email)
+    db_patient.token = get_token(db_patient.id, db_patient.email, "patient")
     return db_patient
 
 
-def change_password(db: Session, user: ChangePassword, token: str):
-    db_patient = verify_token(db, token=token)
+async def change_password(db: Session, user: ChangePassword, patient_id: str):
+    db_patient = await run_in_threadpool(get_patient_by_id, db, id=patient_id)
+    if db_patient is None:
+        # The principal came from a cache entry that outlived the row
+        principal_cache.pop(("patient", patient_id))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     try:
-        hashed = bytes(db_patient.password, "utf-8")
-        password = bytes(user.old_password, "utf-8")
-        result = bcrypt.checkpw(password, hashed)
+        result = await check_password(user.old_password, db_patient.password)
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         print(traceback.format_exc())
@@ -135,10 +144,11 @@ def change_password(db: Session, user: ChangePassword, token: str):
             status_code=status.HTTP_403_FORBIDDEN, detail="Incorrect old password"
         )
     else:
-        password = create_password(user.new_password)
+        password = await hash_password(user.new_password)
         db_patient.password = password
         db_patient.updated_at = now()
-        db.commit()
+        await run_in_threadpool(db.commit)
+        principal_cache.pop(("patient", patient_id))
 
 
 def get_patient(db: Session, patient_id: str):
@@ -149,10 +159,23 @@ def get_patient(db: Session, patient_id: str):
 
 
 def get_all_patients(db: Session):
-    db_patient = db.query(PatientModel).all()
+    query = db.query(PatientModel)
+    max_rows = config.get("all_max_rows", 5000)
+    check_max_rows(query.count(), max_rows, f"More than {max_rows} patients, use stream=true or the paginated list")
+    db_patient = query.all()
     return db_patient
 
 
+def stream_all_patients(db: Session):
+    # get_all_patients as a streamed JSON array of column-only rows
+    query = db.query(*PATIENT_STREAM_COLUMNS)
+    max_rows = config.get("stream_max_rows", 100000)
+    check_max_rows(query.count(), max_rows, f"More than {max_rows} patients, use the paginated list")
+    fields = [column.key for column in PATIENT_STREAM_COLUMNS]
+    chunks = iter_chunks(query, PatientModel.id, config.get("export_chunk_size", 1000))
+    return stream_json_array([dict(zip(fields, row)) for row in rows] for rows in chunks)
+
+
 def update_patient(db: Session, patient_id:str, patient: PatientUpdate):
     db_patient = get_patient_by_id(db=db, id=patient_id)
     if db_patient is None:
@@ -166,31 +189,6 @@ def update_patient(db: Session, patient_id:str, patient: PatientUpdate):
     db_patient.weight = patient.weight
     db_patient.updated_at = now()
     db.commit()
+    principal_cache.pop(("patient", patient_id))
+    invalidate_counts("patients")
     return db_patient
-
-
-def verify_token(db: Session, token: str):
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token."
-        )
-    else:
-        try:
-            key = jwk.JWK(**config["jwt_key"])
-            ET = jwt.JWT(key=key, jwt=token)
-            ST = jwt.JWT(key=key, jwt=ET.claims)
-            claims = ST.claims
-            claims = json.loads(claims)
-            db_patient = get_patient_by_id(db, claims["id"])
-        except ValueError as e:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token."
-            )
-        except Exception as e:
-            print(e)
-            print(traceback.format_exc())
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if db_patient is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        return db_patient
-
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from config import config
+from libs.intervals import Interval
+from models import AppointmentModel, AppointmentSlotModel
+
+
+# Every grid is aligned to this instant, so a slot size that does not divide a day
+# still gives every booking the same grid
+SLOT_EPOCH = datetime(1970, 1, 1)
+
+
+def get_slot_size():
+    return timedelta(minutes=config.get("slot_minutes", 15))
+
+
+def get_slot_starts(from_time: datetime, to_time: datetime):
+    """
+    Grid slots touched by [from_time, to_time)
+    - The grid is aligned to SLOT_EPOCH
+    """
+    size = get_slot_size()
+    from_time = from_time.replace(tzinfo=None, microsecond=0)
+    to_time = to_time.replace(tzinfo=None, microsecond=0)
+    slot_start = SLOT_EPOCH + (from_time - SLOT_EPOCH) // size * size
+    slot_starts = []
+    while slot_start < to_time:
+        slot_starts.append(slot_start)
+        slot_start += size
+    return slot_starts
+
+
+def reserve_slots(db: Session, doctor_id: str, intervals: list):
+    # A taken slot fails the insert on the (doctor_id, slot_start) primary key
+    created_at = datetime.now()
+    rows = [
+        {"doctor_id": doctor_id, "slot_start": slot_start, "appointment_id": interval.id, "created_at": created_at}
+        for interval in intervals
+        for slot_start in get_slot_starts(interval.from_time, interval.to_time)
+    ]
+    if rows:
+        db.execute(AppointmentSlotModel.__table__.insert().values(rows))
+
+
+def release_slots(db: Session, appointment_ids: list):
+    (
+        db.query(AppointmentSlotModel)
+        .filter(AppointmentSlotModel.appointment_id.in_(appointment_ids))
+        .delete(synchronize_session=False)
+    )
+
+
+def get_booked_slots(db: Session, doctor_id: str, from_time: datetime, to_time: datetime):
+    slot_starts = get_slot_starts(from_time, to_time)
+    if not slot_starts:
+        return []
+    size = get_slot_size()
+    rows = (
+        db.query(AppointmentSlotModel.slot_start, AppointmentSlotModel.appointment_id)
+        .filter(
+            AppointmentSlotModel.doctor_id == doctor_id,
+            AppointmentSlotModel.slot_start >= slot_starts[0],
+            AppointmentSlotModel.slot_start <= slot_starts[-1],
+        )
+        .order_by(AppointmentSlotModel.slot_start)
+        .all()
+    )
+    return [Interval(slot_start, slot_start + size, appointment_id) for slot_start, appointment_id in rows]
+
+
+def rebuild_slots(db: Session):
+    """
+    Recreate every reservation from active appointments
+    - Overlapping legacy appointments keep whichever reservation is inserted first
+    """
+    db.query(AppointmentSlotModel).delete(synchronize_session=False)
+    appointments = (
+        db.query(AppointmentModel.id, AppointmentModel.doctor_id, AppointmentModel.from_time, AppointmentModel.to_time)
+        .filter(
+            AppointmentModel.is_deleted == False,
+            AppointmentModel.status.in_(['Created', 'Rescheduled']),
+        )
+        .order_by(AppointmentModel.created_at)
+        .yield_per(1000)
+    )
+    created_at = datetime.now()
+    count = 0
+    for id, doctor_id, from_time, to_time in appointments:
+        rows = [
+            {"doctor_id": doctor_id, "slot_start": slot_start, "appointment_id": id, "created_at": created_at}
+            for slot_start in get_slot_starts(from_time, to_time)
+        ]
+        if rows:
+            db.execute(AppointmentSlotModel.__table__.insert().prefix_with("IGNORE").values(rows))
+            count += 1
+    db.commit()
+    return count
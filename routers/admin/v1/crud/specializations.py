@@ -1,10 +1,32 @@
+import hashlib
+import json
+
+from collections import namedtuple
 from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
 
-from libs.utils import generate_id, now
+from config import config
+from libs.cache import TTLCache
+from libs.pagination import CountStrategyEnum, invalidate_counts, paginate, table_version
+from libs.utils import eager_load, generate_id, now
 from models import SpecializationModel, DoctorSpecializationModel
-from routers.admin.v1.schemas import SpecializationAdd
+from routers.admin.v1.schemas import Specialization, SpecializationAdd
+
+SPECIALIZATION_SORT_COLUMNS = {
+    "name": SpecializationModel.name,
+    "deacription": SpecializationModel.description,
+}
+
+# Relationships serialized by schemas.DoctorSpecialization
+DOCTOR_SPECIALIZATION_RESPONSE = (DoctorSpecializationModel.doctor, DoctorSpecializationModel.specialization)
+
+Catalog = namedtuple("Catalog", ["body", "etag"])
+
+# Keyed by the table version, so add, update and delete make the cached body unreachable
+catalog_cache = TTLCache(maxsize=2, ttl=config.get("catalog_cache_ttl", 300))
+
 
 def get_specialization_by_name(db: Session, name:str):
     db_spec = db.query(SpecializationModel).filter(SpecializationModel.name == name, SpecializationModel.is_deleted == False).first()
@@ -21,7 +43,8 @@ def get_specialization_list(
     limit: int,
     search: str,
     sort_by: str,
-    order: str
+    order: str,
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
 ):
     query = db.query(SpecializationModel).filter(SpecializationModel.is_deleted == False)
 
@@ -34,22 +57,24 @@ def get_specialization_list(
             )
         )
 
-        if sort_by == "name":
-            if order == "desc":
-                query = query.order_by(SpecializationModel.first_name.desc())
-            else:
-                query = query.order_by(SpecializationModel.first_name)
-        elif sort_by == "deacription":
-            if order == "desc":
-                query = query.order_by(SpecializationModel.last_name.desc())
-            else:
-                query = query.order_by(SpecializationModel.last_name)
-        else:
-            query = query.order_by(SpecializationModel.created_at.desc())
-
-    count = query.count()
-    results = query.offset(start).limit(limit).all()
-    data = {"count": count, "list": results}
+    sort_column = SPECIALIZATION_SORT_COLUMNS.get(sort_by)
+    if sort_column is None:
+        sort_by, sort_column, descending = "created_at", SpecializationModel.created_at, True
+    else:
+        descending = order == "desc"
+
+    data = paginate(
+        query,
+        start=start,
+        limit=limit,
+        cursor=None,
+        sort_by=sort_by,
+        sort_column=sort_column,
+        descending=descending,
+        id_column=SpecializationModel.id,
+        count_strategy=count_strategy,
+        count_key=("specializations", search),
+    )
     return data
 
 
@@ -64,6 +89,7 @@ def add_specialization(db: Session, specialization: SpecializationAdd):
     db.add(db_spec)
     db.commit()
     db.refresh(db_spec)
+    invalidate_counts("specializations")
     return db_spec
 
 
@@ -75,7 +101,12 @@ def get_specialization(db: Session, specialization_id: str):
 
 
 def get_specialization_doctors(db: Session, specialization_id: str):
-    db_spec_doctors = db.query(DoctorSpecializationModel).filter(DoctorSpecializationModel.specialization_id == specialization_id).all()
+    db_spec_doctors = (
+        db.query(DoctorSpecializationModel)
+        .options(*eager_load(*DOCTOR_SPECIALIZATION_RESPONSE))
+        .filter(DoctorSpecializationModel.specialization_id == specialization_id)
+        .all()
+    )
     return db_spec_doctors
 
 
@@ -84,6 +115,21 @@ def get_all_specialization(db: Session):
     return db_spec
 
 
+def get_specialization_catalog(db: Session):
+    """
+    Serialized JSON body of get_all_specialization with its strong ETag
+    - Built once per table version, other workers catch up within catalog_cache_ttl
+    """
+    version = table_version("specializations")
+    catalog = catalog_cache.get(version)
+    if catalog is None:
+        specializations = [Specialization.from_orm(db_spec) for db_spec in get_all_specialization(db=db)]
+        body = json.dumps(jsonable_encoder(specializations), separators=(",", ":")).encode("utf-8")
+        catalog = Catalog(body=body, etag='"%s"' % hashlib.sha256(body).hexdigest())
+        catalog_cache.set(version, catalog)
+    return catalog
+
+
 def update_specialization(db: Session, specialization_id: str, specialization: SpecializationAdd):
     db_spec = get_specialization_by_id(db=db, id=specialization_id)
     if db_spec is None:
@@ -98,6 +144,7 @@ def update_specialization(db: Session, specialization_id: str, specialization: S
     db_spec.updated_at = now()
     db.commit()
     db.refresh(db_spec)
+    invalidate_counts("specializations")
     return db_spec
 
 
@@ -110,4 +157,5 @@ def delete_specialization(db: Session,  specialization_id: str):
     db_spec.updated_at = now()
     db.commit()
     db.refresh(db_spec)
+    invalidate_counts("specializations")
     return
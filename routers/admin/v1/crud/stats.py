@@ -0,0 +1,109 @@
+from collections import namedtuple
+from datetime import date, datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+
+from config import config
+from models import AppointmentModel, DoctorDailyStatModel
+
+
+AppointmentStat = namedtuple("AppointmentStat", ["doctor_id", "from_time", "to_time", "status"])
+
+
+def get_appointment_stat(db_appointment: AppointmentModel):
+    # Deleted appointments drop out of the rollup
+    if db_appointment.is_deleted or db_appointment.doctor_id is None:
+        return None
+    return AppointmentStat(
+        db_appointment.doctor_id, db_appointment.from_time, db_appointment.to_time, db_appointment.status
+    )
+
+
+def record_stats(db: Session, removed: list = (), added: list = ()):
+    """
+    Apply appointment changes to doctor_daily_stats in the caller's transaction
+    - Each AppointmentStat counts once on the day of its from_time
+    - Deltas are summed per (doctor_id, day, status) and upserted in one statement
+    """
+    deltas = {}
+    for sign, stats in ((-1, removed), (1, added)):
+        for stat in stats:
+            if stat is None:
+                continue
+            key = (stat.doctor_id, stat.from_time.date(), stat.status)
+            minutes = int((stat.to_time - stat.from_time).total_seconds()) // 60
+            count_delta, minutes_delta = deltas.get(key, (0, 0))
+            deltas[key] = (count_delta + sign, minutes_delta + sign * minutes)
+
+    updated_at = datetime.now()
+    rows = [
+        {
+            "doctor_id": doctor_id,
+            "day": day,
+            "status": status,
+            "appointments": count_delta,
+            "booked_minutes": minutes_delta,
+            "updated_at": updated_at,
+        }
+        for (doctor_id, day, status), (count_delta, minutes_delta) in deltas.items()
+        if count_delta or minutes_delta
+    ]
+    if not rows:
+        return
+
+    statement = insert(DoctorDailyStatModel.__table__).values(rows)
+    db.execute(statement.on_duplicate_key_update(
+        appointments=DoctorDailyStatModel.__table__.c.appointments + statement.inserted.appointments,
+        booked_minutes=DoctorDailyStatModel.__table__.c.booked_minutes + statement.inserted.booked_minutes,
+        updated_at=statement.inserted.updated_at,
+    ))
+
+
+def get_doctor_daily_stats(db: Session, from_date: date, to_date: date, doctor_id: str):
+    if from_date > to_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from date is greater than to date")
+    max_days = config.get("analytics_max_days", 366)
+    if (to_date - from_date).days >= max_days:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"date range is longer than {max_days} days")
+
+    query = db.query(DoctorDailyStatModel).filter(
+        DoctorDailyStatModel.day >= from_date,
+        DoctorDailyStatModel.day <= to_date,
+        DoctorDailyStatModel.appointments != 0,
+    )
+    if doctor_id != "all":
+        query = query.filter(DoctorDailyStatModel.doctor_id == doctor_id)
+    return query.order_by(
+        DoctorDailyStatModel.doctor_id, DoctorDailyStatModel.day, DoctorDailyStatModel.status
+    ).all()
+
+
+def rebuild_stats(db: Session):
+    """
+    Recompute the whole rollup from appointments with one INSERT ... SELECT
+    - Run it while appointment writes are stopped, concurrent deltas are lost
+    """
+    db.query(DoctorDailyStatModel).delete(synchronize_session=False)
+    day = func.date(AppointmentModel.from_time)
+    rollup = (
+        db.query(
+            AppointmentModel.doctor_id,
+            day,
+            AppointmentModel.status,
+            func.count(AppointmentModel.id),
+            func.sum(func.timestampdiff(literal_column("MINUTE"), AppointmentModel.from_time, AppointmentModel.to_time)),
+            func.now(),
+        )
+        .filter(AppointmentModel.is_deleted == False, AppointmentModel.doctor_id != None)
+        .group_by(AppointmentModel.doctor_id, day, AppointmentModel.status)
+    )
+    table = DoctorDailyStatModel.__table__
+    result = db.execute(table.insert().from_select(
+        ["doctor_id", "day", "status", "appointments", "booked_minutes", "updated_at"],
+        rollup.statement,
+    ))
+    db.commit()
+    return result.rowcount
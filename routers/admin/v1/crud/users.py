@@ -1,15 +1,12 @@
-import json
 import traceback
-import bcrypt
 
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from jwcrypto import jwk, jwt
+from fastapi.concurrency import run_in_threadpool
 
-from libs.utils import create_password, generate_id, get_token, now
+from libs.utils import check_password, generate_id, get_token, hash_password, now, principal_cache, release_email, save_unique
 from models import AdminUserModel
-from config import config
 from routers.admin.v1.schemas import ChangePassword, SignIn, UserSignUp, UserUpdate
 
 
@@ -21,67 +18,34 @@ def get_user_by_email(db: Session, email: str):
     return db.query(AdminUserModel).filter(AdminUserModel.email == email).first()
 
 
-def verify_token(db: Session, token: str):
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token."
-        )
-    else:
-        try:
-            key = jwk.JWK(**config["jwt_key"])
-            ET = jwt.JWT(key=key, jwt=token)
-            ST = jwt.JWT(key=key, jwt=ET.claims)
-            claims = ST.claims
-            claims = json.loads(claims)
-            db_patient = get_user_by_id(db, claims["id"])
-        except ValueError as e:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token."
-            )
-        except Exception as e:
-            print(e)
-            print(traceback.format_exc())
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        if db_patient is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-        return db_patient
-
-
-def add_user(db: Session, user: UserSignUp):
+async def add_user(db: Session, user: UserSignUp):
     id = generate_id()
-    db_user = get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="User already exist."
-        )
-    user.password = create_password(user.password)
-    db_user = AdminUserModel(id=id, **user.dict)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    user.password = await hash_password(user.password)
+    db_user = AdminUserModel(id=id, **user.dict())
+    await run_in_threadpool(save_unique, db, db_user, "User already exist.")
     return user
 
 
-def sign_in(db: Session, user: SignIn):
-    db_user = get_user_by_email(db, email=user.email)
+async def sign_in(db: Session, user: SignIn):
+    db_user = await run_in_threadpool(get_user_by_email, db, email=user.email)
     if db_user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    hashed = db_user.password
-    hashed = bytes(hashed, "utf-8")
-    password = bytes(user.password, "utf-8")
-    if not bcrypt.checkpw(password, hashed):
+    if not await check_password(user.password, db_user.password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    db_user.token = get_token(db_user.id, db_user.email)
-    get_token(db_user.id, db_user.email)
+    db_user.token = get_token(db_user.id, db_user.email, "admin")
     return db_user
 
 
-def change_password(db: Session, user: ChangePassword, token: str):
-    db_user = verify_token(db, token=token)
+async def change_password(db: Session, user: ChangePassword, user_id: str):
+    db_user = await run_in_threadpool(get_user_by_id, db, id=user_id)
+    if db_user is None or db_user.is_deleted:
+        # The principal came from a cache entry that outlived the row
+        principal_cache.pop(("admin", user_id))
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     try:
-        hashed = bytes(db_user.password, "utf-8")
-        password = bytes(user.old_password, "utf-8")
-        result = bcrypt.checkpw(password, hashed)
+        result = await check_password(user.old_password, db_user.password)
+    except HTTPException:
+        raise
     except Exception as e:
         print(e)
         print(traceback.format_exc())
@@ -91,10 +55,11 @@ def change_password(db: Session, user: ChangePassword, token: str):
             status_code=status.HTTP_403_FORBIDDEN, detail="Incorrect old password"
         )
     else:
-        password = create_password(user.new_password)
+        password = await hash_password(user.new_password)
         db_user.password = password
         db_user.updated_at = now()
-        db.commit()
+        await run_in_threadpool(db.commit)
+        principal_cache.pop(("admin", user_id))
 
 
 def get_users(
@@ -161,6 +126,9 @@ def delete_user(db: Session, user_id: str):
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
         )
     db_user.is_deleted = True
+    # The unique index covers deleted rows, free the address for a new sign-up
+    db_user.email = release_email(AdminUserModel.email, db_user.email, db_user.id)
     db_user.updated_at = now()
     db.commit()
+    principal_cache.pop(("admin", user_id))
     return
@@ -1,10 +1,13 @@
+import enum
+
 from typing import List, Optional
 from fastapi import HTTPException, status
 from pydantic import BaseModel, Field, validator
 from email_validator import EmailNotValidError, validate_email
 
-from datetime import datetime
+from datetime import date, datetime
 
+from libs.pagination import CountStrategyEnum
 from models import GenderEnum, StatusEnum
 
 
@@ -117,6 +120,9 @@ class Patient(BaseModel):
 class PatientList(BaseModel):
     count: int
     list: List[Patient] = []
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact
 
     class Config:
         orm_mode = True
@@ -163,6 +169,8 @@ class Specialization(BaseModel):
 class SpecializationList(BaseModel):
     count: int
     list: List[Specialization] = []
+    has_more: bool = False
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact
 
     class Config:
         orm_mode = True
@@ -244,6 +252,9 @@ class Doctor(BaseModel):
 class DoctorList(BaseModel):
     count: int
     list: List[Doctor] = []
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact
 
     class Config:
         orm_mode = True
@@ -263,6 +274,21 @@ class AppointmentAdd(BaseModel):
     description: str = Field(None)
 
 
+class Canceller(BaseModel):
+    """
+    Patient or doctor who canceled an appointment
+    """
+
+    id: str
+    first_name: str
+    last_name: str
+    email: str
+    number: str
+
+    class Config:
+        orm_mode = True
+
+
 class Appointment(BaseModel):
     id: str
     patient: Patient
@@ -270,7 +296,7 @@ class Appointment(BaseModel):
     from_time: datetime
     to_time: datetime
     status: StatusEnum
-    canceller: Optional[str] = None
+    canceller: Optional[Canceller] = None
     description: Optional[str] = None
 
     class Config:
@@ -280,6 +306,9 @@ class Appointment(BaseModel):
 class AppointmentList(BaseModel):
     count: int
     list: List[Appointment] = []
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    count_strategy: CountStrategyEnum = CountStrategyEnum.exact
 
     class Config:
         orm_mode = True
@@ -290,3 +319,59 @@ class AppointmentUpdate(BaseModel):
     from_time: datetime
     to_time: datetime
     description: str = Field(None)
+
+
+class FreeSlot(BaseModel):
+    from_time: datetime
+    to_time: datetime
+
+
+class BulkModeEnum(enum.Enum):
+    """
+    Bulk Booking Modes
+    - all_or_nothing : any conflict rejects the whole batch
+    - partial : conflicting slots are skipped, the rest are booked
+    """
+
+    all_or_nothing = "all_or_nothing"
+    partial = "partial"
+
+
+class AppointmentSlot(BaseModel):
+    from_time: datetime
+    to_time: datetime
+
+
+class AppointmentRecurrence(BaseModel):
+    from_time: datetime
+    to_time: datetime
+    interval_days: int = Field(7, ge=1, le=365)
+    occurrences: int = Field(..., ge=1, le=100)
+
+
+class AppointmentBulkAdd(BaseModel):
+    patient_id: str = Field(..., min_length=36, max_length=36)
+    doctor_id: str = Field(..., min_length=36, max_length=36)
+    description: str = Field(None)
+    slots: List[AppointmentSlot] = Field([], max_items=100)
+    recurrence: Optional[AppointmentRecurrence] = None
+    mode: BulkModeEnum = BulkModeEnum.all_or_nothing
+
+
+class AppointmentBulkResult(BaseModel):
+    created: List[Appointment] = []
+    conflicts: List[AppointmentSlot] = []
+
+
+# Analytics
+
+
+class DoctorDailyStat(BaseModel):
+    doctor_id: str
+    day: date
+    status: StatusEnum
+    appointments: int
+    booked_minutes: int
+
+    class Config:
+        orm_mode = True
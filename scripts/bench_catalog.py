@@ -0,0 +1,72 @@
+"""
+Throughput of GET /specializations/all, full body against 304
+
+Fetches the catalog once for its ETag, then keeps `--concurrency` threads
+sending plain GETs for `--seconds`, then the same with If-None-Match. Exits
+non-zero when any request fails or the conditional requests are not 304.
+
+    python scripts/bench_catalog.py --url http://localhost:8000
+"""
+import argparse
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+def fetch(url: str, etag: str = None):
+    headers = {"If-None-Match": etag} if etag else {}
+    try:
+        with urlopen(Request(url, headers=headers), timeout=30) as response:
+            body = response.read()
+            return response.status, response.headers.get("ETag"), len(body)
+    except HTTPError as e:
+        return e.code, e.headers.get("ETag"), 0
+    except URLError:
+        return None, None, 0
+
+
+def measure(url: str, etag: str, concurrency: int, seconds: float):
+    deadline = time.perf_counter() + seconds
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(_):
+        while time.perf_counter() < deadline:
+            status, _, _ = fetch(url, etag)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    return sum(statuses.values()) / (time.perf_counter() - started), statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/specializations/all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + args.path
+    status, etag, size = fetch(url)
+    if status != 200 or not etag:
+        sys.exit(f"GET {args.path} answered {status} without an ETag")
+    print(f"GET {args.path}: {size} bytes, ETag {etag}")
+
+    full_rate, full_statuses = measure(url, None, args.concurrency, args.seconds)
+    cached_rate, cached_statuses = measure(url, etag, args.concurrency, args.seconds)
+    print(f"  full body     {full_rate:10.0f} requests/s  statuses {full_statuses}")
+    print(f"  If-None-Match {cached_rate:10.0f} requests/s  statuses {cached_statuses}")
+    if set(full_statuses) != {200} or set(cached_statuses) != {304}:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
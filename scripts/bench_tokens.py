@@ -0,0 +1,74 @@
+"""
+Token issue and verify throughput per token format
+
+For the nested (JWS in JWE) and the compact (JWS only) format, times get_token
+and decode_token on one bearer token three ways: with the verified-token cache,
+with the cache cleared before every call, and for nested tokens the way
+verification worked before the cache, rebuilding the JWK on every call.
+
+    python scripts/bench_tokens.py --iterations 2000
+
+Reads the jwt_key of config.py, no database is needed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from jwcrypto import jwk, jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from libs.utils import decode_token, generate_id, get_token, token_cache
+
+
+def decode_uncached(token: str):
+    token_cache.clear()
+    return decode_token(token)
+
+
+def decode_rebuilding_key(token: str):
+    key = jwk.JWK(**config["jwt_key"])
+    ET = jwt.JWT(key=key, jwt=token)
+    ST = jwt.JWT(key=key, jwt=ET.claims)
+    return json.loads(ST.claims)
+
+
+def rate(func, arg, iterations: int):
+    func(arg)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return iterations / (time.perf_counter() - started)
+
+
+def issue(user_id: str):
+    return get_token(user_id, "bench@example.com", "patient")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    for token_format in ("nested", "compact"):
+        config["token_format"] = token_format
+        token = issue(generate_id())
+        runs = [("verify cached", decode_token), ("verify uncached", decode_uncached)]
+        if token_format == "nested":
+            # The per-call key rebuild only existed for nested tokens
+            runs.append(("verify before cache", decode_rebuilding_key))
+
+        token_cache.clear()
+        token_cache.hits = token_cache.misses = 0
+        results = {"issue": rate(issue, generate_id(), args.iterations)}
+        results.update((name, rate(func, token, args.iterations)) for name, func in runs)
+        print(f"{token_format}: {len(token)} bytes")
+        for name, per_second in results.items():
+            print(f"  {name:20} {per_second:12.0f}/s")
+        print(f"  cache speedup {results['verify cached'] / results['verify uncached']:.0f}x, token cache {token_cache.stats()}")
+
+if __name__ == "__main__":
+    main()
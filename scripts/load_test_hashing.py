@@ -0,0 +1,108 @@
+"""
+GET latency while sign-ins saturate the bcrypt pool
+
+Measures the p99 of a cheap GET on an idle server, then again while
+`--login-workers` threads keep posting to a sign-in route. With hashing on
+its own bounded pool the two p99 values stay close, surplus logins get 503.
+
+    python scripts/load_test_hashing.py --url http://localhost:8000 \
+        --email patient@example.com --password secret
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+
+def request(url: str, body: dict = None):
+    data = None if body is None else json.dumps(body).encode("utf-8")
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    try:
+        with urlopen(Request(url, data=data, headers=headers), timeout=30) as response:
+            response.read()
+            return response.status
+    except HTTPError as e:
+        return e.code
+    except URLError:
+        return None
+
+
+def percentile(values: list, fraction: float):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure_gets(url: str, count: int, concurrency: int):
+    def timed_get(_):
+        started = time.perf_counter()
+        status = request(url)
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_get, range(count)))
+    failed = sum(1 for _, status in results if status != 200)
+    return [latency for latency, _ in results], failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--get-path", default="/specializations/all")
+    parser.add_argument("--login-path", default="/patients/sign-in")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--gets", type=int, default=500)
+    parser.add_argument("--get-concurrency", type=int, default=4)
+    parser.add_argument("--login-workers", type=int, default=64)
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="Fail when loaded p99 exceeds idle p99 by this factor")
+    args = parser.parse_args()
+
+    get_url = args.url.rstrip("/") + args.get_path
+    login_url = args.url.rstrip("/") + args.login_path
+    credentials = {"email": args.email, "password": args.password}
+
+    idle, idle_failed = measure_gets(get_url, args.gets, args.get_concurrency)
+
+    stop = threading.Event()
+    statuses = {}
+    statuses_lock = threading.Lock()
+
+    def login_loop():
+        while not stop.is_set():
+            status = request(login_url, credentials)
+            with statuses_lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+    login_threads = [threading.Thread(target=login_loop, daemon=True) for _ in range(args.login_workers)]
+    logins_started = time.perf_counter()
+    for thread in login_threads:
+        thread.start()
+    # Let the hashing pool fill up before measuring
+    time.sleep(2)
+    loaded, loaded_failed = measure_gets(get_url, args.gets, args.get_concurrency)
+    stop.set()
+    for thread in login_threads:
+        thread.join()
+    elapsed = time.perf_counter() - logins_started
+
+    idle_p99 = percentile(idle, 0.99)
+    loaded_p99 = percentile(loaded, 0.99)
+    logins = sum(statuses.values())
+    print(f"GET {args.get_path}")
+    print(f"  idle   p50 {percentile(idle, 0.5) * 1000:8.1f} ms  p99 {idle_p99 * 1000:8.1f} ms  failed {idle_failed}")
+    print(f"  loaded p50 {percentile(loaded, 0.5) * 1000:8.1f} ms  p99 {loaded_p99 * 1000:8.1f} ms  failed {loaded_failed}")
+    print(f"POST {args.login_path}: {logins} requests, {logins / elapsed:.1f}/s, statuses {statuses}")
+
+    ratio = loaded_p99 / idle_p99 if idle_p99 else float("inf")
+    print(f"p99 ratio {ratio:.2f} (max {args.max_ratio})")
+    if idle_failed or loaded_failed or ratio > args.max_ratio:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import importlib.util
+import os
+import sys
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+
+from jwcrypto import jwk
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The suite runs on config.template.py, never on a deployment's config.py
+spec = importlib.util.spec_from_file_location("config", os.path.join(ROOT, "config.template.py"))
+config_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(config_module)
+config_module.config.update({
+    "db_host": "localhost",
+    "db_name": "appointments",
+    "db_user": "appointments",
+    "db_pass": "appointments",
+    "salt": b"$2b$04$0123456789abcdefghijkl",
+    "jwt_key": jwk.JWK.generate(kty="oct", size=256).export(as_dict=True),
+    "sweeper_interval": 0,
+})
+sys.modules["config"] = config_module
+
+from database import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine():
+    # TEST_DATABASE_URL points the suite at MySQL, otherwise an in-memory SQLite database is used
+    url = os.environ.get("TEST_DATABASE_URL")
+    if url:
+        engine = create_engine(url)
+    else:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def count_queries(engine):
+    """
+    Context manager collecting every statement sent to the database
+    """
+
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
+@pytest.fixture
+def seed(db):
+    """
+    Inserts doctors, specializations, patients and appointments straight through the session
+    """
+    from models import (
+        AppointmentModel, DoctorModel, DoctorSpecializationModel, GenderEnum, PatientModel, SpecializationModel, StatusEnum
+    )
+    from libs.utils import generate_id
+
+    class Seed:
+        def doctor(self, **values):
+            db_doctor = DoctorModel(**{
+                "id": generate_id(), "first_name": "Doctor", "last_name": "Seed", "email": f"{generate_id()}@example.com",
+                "password": "0", "number": "0000000000", **values
+            })
+            db.add(db_doctor)
+            return db_doctor
+
+        def patient(self, **values):
+            db_patient = PatientModel(**{
+                "id": generate_id(), "first_name": "Patient", "last_name": "Seed", "email": f"{generate_id()}@example.com",
+                "password": "0", "number": "0000000000", "gender": GenderEnum.Male, "height": 170, "weight": 70, **values
+            })
+            db.add(db_patient)
+            return db_patient
+
+        def specialization(self, **values):
+            db_specialization = SpecializationModel(**{"id": generate_id(), "name": "Specialization", **values})
+            db.add(db_specialization)
+            return db_specialization
+
+        def doctor_specialization(self, db_doctor, db_specialization):
+            db_doctor_specialization = DoctorSpecializationModel(
+                id=generate_id(), doctor_id=db_doctor.id, specialization_id=db_specialization.id
+            )
+            db.add(db_doctor_specialization)
+            return db_doctor_specialization
+
+        def appointments(self, count: int, doctors: list, patients: list, canceled_every: int = 0):
+            db_appointments = []
+            start = datetime(2030, 1, 1, 9)
+            for i in range(count):
+                db_patient = patients[i % len(patients)]
+                db_doctor = doctors[i % len(doctors)]
+                canceled = canceled_every and i % canceled_every == 0
+                from_time = start + timedelta(minutes=30 * i)
+                db_appointment = AppointmentModel(
+                    id=generate_id(),
+                    patient_id=db_patient.id,
+                    doctor_id=db_doctor.id,
+                    from_time=from_time,
+                    to_time=from_time + timedelta(minutes=30),
+                    status=StatusEnum.Canceled if canceled else StatusEnum.Created,
+                    canceller_id=(db_patient.id if i % 2 else db_doctor.id) if canceled else None,
+                    description=f"Appointment {i}",
+                    created_at=start - timedelta(minutes=i),
+                )
+                db.add(db_appointment)
+                db_appointments.append(db_appointment)
+            return db_appointments
+
+    return Seed()
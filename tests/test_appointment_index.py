@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from libs.intervals import IntervalIndex
+from routers.admin.v1 import schemas
+from routers.admin.v1.crud import appointments
+
+
+@pytest.fixture
+def appointment_index(monkeypatch):
+    # The stats upsert is MySQL only
+    monkeypatch.setattr(appointments, "record_stats", lambda **kwargs: None)
+    appointment_index = IntervalIndex()
+    monkeypatch.setattr(appointments, "appointment_index", appointment_index)
+    return appointment_index
+
+
+def test_update_with_aware_times_keeps_the_index_consistent(db, seed, appointment_index):
+    doctor, patient = seed.doctor(), seed.patient()
+    db_appointments = seed.appointments(3, [doctor], [patient])
+    doctor_id, moved_id = doctor.id, db_appointments[1].id
+    db.commit()
+    assert appointments.load_doctor_intervals(db, doctor_id)
+
+    from_time = datetime(2031, 1, 1, 9, 0, 0, 500000, tzinfo=timezone.utc)
+    update = schemas.AppointmentUpdate(
+        doctor_id=doctor_id, from_time=from_time, to_time=from_time + timedelta(minutes=30), description="Moved"
+    )
+    appointments.update_appointment(db, update, moved_id)
+
+    naive = datetime(2031, 1, 1, 9)
+    intervals = appointment_index.overlapping(doctor_id, naive, naive + timedelta(minutes=30))
+    assert [(interval.id, interval.from_time) for interval in intervals] == [(moved_id, naive)]
+    # Answered from the index, it matches what the table holds
+    in_table = appointments.check_doctor_availibility(db, naive, naive + timedelta(minutes=30), doctor_id, for_update=True)
+    assert [db_appointment.id for db_appointment in in_table] == [moved_id]
+    assert len(appointment_index.overlapping(doctor_id, datetime(2000, 1, 1), datetime(2100, 1, 1))) == 3
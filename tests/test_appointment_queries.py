@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+
+from libs.pagination import CountStrategyEnum
+from models import StatusEnum
+from routers.admin.v1 import schemas
+from routers.admin.v1.crud import appointments, doctors
+
+LIST_ARGS = dict(start=0, search="all", sort_by="all", order="all", status=None, patient_id="all", doctor_id="all")
+
+
+def list_page(db, count_queries, limit: int):
+    db.expunge_all()
+    with count_queries() as statements:
+        data = appointments.get_appointment_list(db, limit=limit, **LIST_ARGS)
+        page = schemas.AppointmentList(**data)
+    return page, statements
+
+
+def test_appointment_list_queries_do_not_grow_with_the_page(db, seed, count_queries):
+    doctors = [seed.doctor() for _ in range(20)]
+    patients = [seed.patient() for _ in range(40)]
+    seed.appointments(150, doctors, patients, canceled_every=3)
+    db.commit()
+
+    small_page, small_statements = list_page(db, count_queries, limit=10)
+    page, statements = list_page(db, count_queries, limit=100)
+
+    assert len(page.list) == 100
+    assert any(appointment.canceller for appointment in page.list)
+    assert all(appointment.patient and appointment.doctor for appointment in page.list)
+    assert len(statements) == len(small_statements)
+    # count, the page with its doctors, and the patients
+    assert len(statements) <= 3, statements
+
+
+def test_appointment_get_loads_the_response_in_one_query(db, seed, count_queries):
+    doctor, patient = seed.doctor(), seed.patient()
+    db_appointment, = seed.appointments(1, [doctor], [patient], canceled_every=1)
+    appointment_id, doctor_id, patient_id = db_appointment.id, doctor.id, patient.id
+    db.commit()
+    db.expunge_all()
+
+    with count_queries() as statements:
+        appointment = schemas.Appointment.from_orm(appointments.get_appintment(db, appointment_id))
+
+    assert appointment.patient.id == patient_id
+    assert appointment.doctor.id == doctor_id
+    assert appointment.canceller.id == doctor_id
+    assert len(statements) == 1, statements
+
+
+def test_appointment_status_update_does_not_lazy_load(db, seed, count_queries, monkeypatch):
+    # The stats upsert is MySQL only and is not part of the response
+    monkeypatch.setattr(appointments, "record_stats", lambda **kwargs: None)
+    doctor, patient = seed.doctor(), seed.patient()
+    db_appointment, = seed.appointments(1, [doctor], [patient])
+    appointment_id, patient_id = db_appointment.id, patient.id
+    db.commit()
+    db.expunge_all()
+
+    with count_queries() as statements:
+        updated = appointments.update_appointment_status(db, appointment_id, StatusEnum.Canceled, patient_id)
+        appointment = schemas.Appointment.from_orm(updated)
+
+    assert appointment.status == StatusEnum.Canceled
+    assert appointment.canceller.id == patient_id
+    # select with the relationships, update
+    assert len(statements) == 2, statements
+
+
+def test_available_doctors_lists_each_free_doctor_once(db, seed, count_queries):
+    db_specialization = seed.specialization()
+    free, busy = seed.doctor(), seed.doctor()
+    for db_doctor in (free, busy):
+        # The same pair stored twice
+        seed.doctor_specialization(db_doctor, db_specialization)
+        seed.doctor_specialization(db_doctor, db_specialization)
+    db_appointment, = seed.appointments(1, [busy], [seed.patient()])
+    specialization_id, free_id = db_specialization.id, free.id
+    from_time, to_time = db_appointment.from_time, db_appointment.to_time
+    db.commit()
+
+    args = dict(
+        specialization_id=specialization_id, from_time=from_time, to_time=to_time,
+        start=0, limit=10, sort_by="all", order="all",
+    )
+    for count_strategy in (CountStrategyEnum.exact, CountStrategyEnum.cached):
+        page = schemas.DoctorList(**appointments.get_available_doctors(db, count_strategy=count_strategy, **args))
+        assert [doctor.id for doctor in page.list] == [free_id]
+        assert page.count == 1
+
+    # The cached strategy answers the repeated count from the cache
+    with count_queries() as statements:
+        appointments.get_available_doctors(db, count_strategy=CountStrategyEnum.cached, **args)
+    assert not any("count(" in statement.lower() for statement in statements)
+
+
+def test_appointment_update_stores_naive_times_without_a_refresh(db, seed, count_queries, monkeypatch):
+    monkeypatch.setattr(appointments, "record_stats", lambda **kwargs: None)
+    doctor, patient = seed.doctor(), seed.patient()
+    db_appointment, = seed.appointments(1, [doctor], [patient])
+    appointment_id, doctor_id, patient_id = db_appointment.id, doctor.id, patient.id
+    db.commit()
+    db.expunge_all()
+
+    update = schemas.AppointmentUpdate(
+        doctor_id=doctor_id,
+        from_time=datetime(2031, 1, 1, 9, 0, 30, 123456, tzinfo=timezone.utc),
+        to_time=datetime(2031, 1, 1, 9, 30, tzinfo=timezone.utc),
+        description="Moved",
+    )
+    with count_queries() as statements:
+        appointment = schemas.Appointment.from_orm(appointments.update_appointment(db, update, appointment_id))
+
+    assert appointment.from_time == datetime(2031, 1, 1, 9, 0, 30)
+    assert appointment.to_time == datetime(2031, 1, 1, 9, 30)
+    assert appointment.patient.id == patient_id
+    # select with the relationships, doctor lock, availability, update
+    assert len(statements) == 4, statements
+
+
+def test_available_doctors_cached_count_follows_specialization_links(db, seed):
+    db_specialization = seed.specialization()
+    linked, unlinked = seed.doctor(), seed.doctor()
+    seed.doctor_specialization(linked, db_specialization)
+    specialization_id, linked_id, unlinked_id = db_specialization.id, linked.id, unlinked.id
+    db.commit()
+
+    args = dict(
+        specialization_id=specialization_id, from_time=datetime(2040, 1, 1, 9), to_time=datetime(2040, 1, 1, 10),
+        start=0, limit=10, sort_by="all", order="all", count_strategy=CountStrategyEnum.cached,
+    )
+    assert appointments.get_available_doctors(db, **args)["count"] == 1
+
+    doctors.add_doctor_specialization(db, unlinked_id, specialization_id)
+    assert appointments.get_available_doctors(db, **args)["count"] == 2
+
+    doctors.delete_doctor_specialization(db, linked_id, specialization_id)
+    assert appointments.get_available_doctors(db, **args)["count"] == 1
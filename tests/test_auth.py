@@ -0,0 +1,47 @@
+import pytest
+
+from fastapi import HTTPException
+
+from libs.utils import get_token, principal_cache
+from routers.admin.v1.crud import doctors
+from routers.admin.v1.crud.auth import verify_token
+
+
+@pytest.fixture(autouse=True)
+def empty_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+def test_repeat_requests_skip_the_principal_query(db, seed, count_queries):
+    db_doctor = seed.doctor()
+    doctor_id = db_doctor.id
+    db.commit()
+    token = get_token(doctor_id, db_doctor.email, "doctor")
+
+    with count_queries() as first:
+        verify_token(db, token=token, role="doctor")
+    with count_queries() as repeat:
+        for _ in range(10):
+            principal = verify_token(db, token=token, role="doctor")
+
+    assert principal.id == doctor_id
+    assert len(first) == 1
+    assert repeat == []
+
+
+def test_deleted_principal_is_looked_up_again(db, seed, count_queries):
+    db_doctor = seed.doctor()
+    doctor_id = db_doctor.id
+    db.commit()
+    token = get_token(doctor_id, db_doctor.email, "doctor")
+    verify_token(db, token=token, role="doctor")
+
+    doctors.delete_doctor(db, doctor_id)
+    with count_queries() as statements:
+        with pytest.raises(HTTPException) as e:
+            verify_token(db, token=token, role="doctor")
+
+    assert e.value.status_code == 401
+    assert len(statements) == 1
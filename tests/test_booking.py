@@ -0,0 +1,83 @@
+import os
+import random
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pytest
+
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from models import AppointmentModel, StatusEnum
+from routers.admin.v1.crud import appointments
+from routers.admin.v1.schemas import AppointmentAdd
+
+
+def test_reopening_an_appointment_checks_the_doctor_is_free(db, seed, monkeypatch):
+    # The stats upsert is MySQL only
+    monkeypatch.setattr(appointments, "record_stats", lambda **kwargs: None)
+    doctor, patient = seed.doctor(), seed.patient()
+    canceled, = seed.appointments(1, [doctor], [patient], canceled_every=1)
+    seed.appointments(1, [doctor], [patient])
+    canceled_id = canceled.id
+    db.commit()
+
+    with pytest.raises(HTTPException) as e:
+        appointments.update_appointment_status(db, canceled_id, StatusEnum.Created, patient.id)
+    assert e.value.status_code == 208
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL"), reason="needs MySQL row locks")
+def test_parallel_bookings_never_overlap(engine, seed, db):
+    """
+    Hundreds of bookings race for overlapping times of a few doctors
+    - Run against MySQL with TEST_DATABASE_URL, SQLite ignores FOR UPDATE
+    - Prints the booking throughput, run with -s to see it
+    """
+    doctors = [seed.doctor() for _ in range(3)]
+    patients = [seed.patient() for _ in range(10)]
+    doctor_ids, patient_ids = [db_doctor.id for db_doctor in doctors], [db_patient.id for db_patient in patients]
+    db.commit()
+
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    start = appointments.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    random.seed(14)
+    requests = []
+    for _ in range(300):
+        from_time = start + timedelta(minutes=15 * random.randint(0, 40))
+        requests.append(AppointmentAdd(
+            patient_id=random.choice(patient_ids),
+            doctor_id=random.choice(doctor_ids),
+            from_time=from_time,
+            to_time=from_time + timedelta(minutes=15 * random.randint(1, 4)),
+        ))
+
+    def book(appointment: AppointmentAdd):
+        session = Session()
+        try:
+            appointments.add_appointment(session, appointment)
+            return True
+        except HTTPException as e:
+            assert e.status_code == 208
+            return False
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as executor:
+        booked = sum(executor.map(book, requests))
+    elapsed = time.perf_counter() - started
+    print(f"{booked} of {len(requests)} bookings in {elapsed:.2f}s, {len(requests) / elapsed:.1f} requests/s")
+
+    rows = (
+        db.query(AppointmentModel)
+        .filter(AppointmentModel.is_deleted == False, AppointmentModel.status.in_(appointments.ACTIVE_STATUSES))
+        .order_by(AppointmentModel.doctor_id, AppointmentModel.from_time)
+        .all()
+    )
+    assert len(rows) == booked > 0
+    for previous, current in zip(rows, rows[1:]):
+        if previous.doctor_id == current.doctor_id:
+            assert previous.to_time < current.from_time, (previous.id, current.id)
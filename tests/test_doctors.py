@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import parse_obj_as
+
+from routers.admin.v1 import schemas
+from routers.admin.v1.crud import doctors
+from routers.admin.v1.schemas import DoctorAdd
+
+
+def test_deleted_doctor_email_can_sign_up_again(db, seed):
+    specialization_id = seed.specialization().id
+    db.commit()
+    # construct skips the deliverability check, it resolves the domain
+    sign_up = dict(
+        first_name="Ada", last_name="Li", email="ada@example.com", password="secret",
+        number="0000000000", specialization_id=specialization_id,
+    )
+
+    db_doctor = asyncio.run(doctors.add_doctor(db, DoctorAdd.construct(**sign_up)))
+    doctors.delete_doctor(db, db_doctor.id)
+    assert doctors.get_doctor_by_email(db, "ada@example.com") is None
+
+    db_doctor_again = asyncio.run(doctors.add_doctor(db, DoctorAdd.construct(**sign_up)))
+    assert db_doctor_again.id != db_doctor.id
+    assert doctors.get_doctor_by_email(db, "ada@example.com").id == db_doctor_again.id
+
+
+def test_streamed_doctors_have_the_response_shape(db, seed):
+    db_specializations = [seed.specialization(name=f"Specialization {i}") for i in range(2)]
+    for i in range(3):
+        db_doctor = seed.doctor()
+        for db_specialization in db_specializations[:i]:
+            seed.doctor_specialization(db_doctor, db_specialization)
+    db.commit()
+
+    streamed = json.loads("".join(doctors.stream_all_doctors(db)))
+    listed = jsonable_encoder(parse_obj_as(List[schemas.Doctor], doctors.get_all_doctors(db)))
+
+    assert sorted_doctors(streamed) == sorted_doctors(listed)
+
+
+def sorted_doctors(items: list):
+    for item in items:
+        item["doctor_specializations"].sort(key=lambda doctor_specialization: doctor_specialization["id"])
+    return sorted(items, key=lambda item: item["id"])
@@ -0,0 +1,63 @@
+import pytest
+
+from fastapi import HTTPException
+
+from libs.pagination import encode_cursor
+from models import StatusEnum
+from routers.admin.v1.crud import appointments
+
+
+def walk(db, sort_by: str, order: str, limit: int = 3):
+    args = dict(start=0, limit=limit, search="all", sort_by=sort_by, order=order, status=None, patient_id="all", doctor_id="all")
+    ids, cursor = [], None
+    while True:
+        data = appointments.get_appointment_list(db, cursor=cursor, **args)
+        ids += [db_appointment.id for db_appointment in data["list"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def offset_order(db, sort_by: str, order: str):
+    args = dict(start=0, limit=100, search="all", sort_by=sort_by, order=order, status=None, patient_id="all", doctor_id="all")
+    return [db_appointment.id for db_appointment in appointments.get_appointment_list(db, **args)["list"]]
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+@pytest.mark.parametrize("sort_by", ["status", "from_time"])
+def test_cursor_pages_match_the_offset_order(db, seed, sort_by, order):
+    db_appointments = seed.appointments(14, [seed.doctor()], [seed.patient()], canceled_every=3)
+    for i, db_appointment in enumerate(db_appointments):
+        db_appointment.status = list(StatusEnum)[i % len(StatusEnum)]
+        if i % 4 == 0:
+            db_appointment.from_time = None
+    db.commit()
+
+    ids = walk(db, sort_by, order)
+
+    assert ids == offset_order(db, sort_by, order)
+    assert len(ids) == len(set(ids)) == 14
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_status_sorts_in_declared_order(db, seed, order):
+    db_appointments = seed.appointments(8, [seed.doctor()], [seed.patient()])
+    for i, db_appointment in enumerate(db_appointments):
+        db_appointment.status = list(StatusEnum)[i % len(StatusEnum)]
+    db.commit()
+
+    args = dict(start=0, limit=100, search="all", sort_by="status", order=order, status=None, patient_id="all", doctor_id="all")
+    statuses = [db_appointment.status for db_appointment in appointments.get_appointment_list(db, **args)["list"]]
+
+    # The order MySQL gives the native ENUM, not the alphabetical one
+    declared = [status for status in StatusEnum for _ in range(2)]
+    assert statuses == (declared if order == "asc" else declared[::-1])
+
+
+def test_cursor_with_an_unknown_enum_value_is_rejected(db):
+    cursor = encode_cursor("status", False, "Lost", "0" * 36)
+    args = dict(start=0, limit=10, search="all", sort_by="status", order="asc", status=None, patient_id="all", doctor_id="all")
+
+    with pytest.raises(HTTPException) as e:
+        appointments.get_appointment_list(db, cursor=cursor, **args)
+    assert e.value.status_code == 400
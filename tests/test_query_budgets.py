@@ -0,0 +1,71 @@
+"""
+Query budgets per endpoint
+- Each case runs the crud function behind a route and serializes the result
+  with the route's response model on a fresh session
+- The budget is the number of statements allowed, it must not depend on the
+  number of rows returned
+"""
+from typing import List
+
+import pytest
+
+from pydantic import parse_obj_as
+
+from routers.admin.v1 import schemas
+from routers.admin.v1.crud import doctors, specializations
+
+LIST_ARGS = dict(start=0, search="all", sort_by="all", order="all")
+
+
+def doctors_list(db, ids, limit):
+    return schemas.DoctorList(**doctors.get_doctors_list(db, limit=limit, **LIST_ARGS))
+
+
+def all_doctors(db, ids, limit):
+    return parse_obj_as(List[schemas.Doctor], doctors.get_all_doctors(db))
+
+
+def doctor(db, ids, limit):
+    return schemas.Doctor.from_orm(doctors.get_doctor(db, ids["doctor"], relationships=doctors.DOCTOR_RESPONSE))
+
+
+def specialization_doctors(db, ids, limit):
+    data = specializations.get_specialization_doctors(db, ids["specialization"])
+    return parse_obj_as(List[schemas.DoctorSpecialization], data)
+
+
+# name, call, budget
+ENDPOINTS = [
+    # count, doctors, their specializations with the specialization joined
+    ("GET /doctors", doctors_list, 3),
+    # count, doctors, their specializations with the specialization joined
+    ("GET /doctors/all", all_doctors, 3),
+    # doctor, its specializations with the specialization joined
+    ("GET /doctors/{doctor_id}", doctor, 2),
+    # specialization rows with doctor and specialization joined
+    ("GET /specializations/{specialization_id}/doctors", specialization_doctors, 1),
+]
+
+
+def seed_doctors(db, seed, count: int):
+    db_specializations = [seed.specialization(name=f"Specialization {i}") for i in range(3)]
+    db_doctors = [seed.doctor() for _ in range(count)]
+    for db_doctor in db_doctors:
+        for db_specialization in db_specializations:
+            seed.doctor_specialization(db_doctor, db_specialization)
+    ids = {"doctor": db_doctors[0].id, "specialization": db_specializations[0].id}
+    db.commit()
+    return ids
+
+
+@pytest.mark.parametrize("name, call, budget", ENDPOINTS, ids=[endpoint[0] for endpoint in ENDPOINTS])
+@pytest.mark.parametrize("rows", [1, 25])
+def test_query_budget(db, seed, count_queries, name, call, budget, rows):
+    ids = seed_doctors(db, seed, rows)
+    db.expunge_all()
+
+    with count_queries() as statements:
+        response = call(db, ids, limit=rows)
+
+    assert response
+    assert len(statements) <= budget, f"{name} sent {len(statements)} statements, budget {budget}: {statements}"
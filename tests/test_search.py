@@ -0,0 +1,43 @@
+import pytest
+
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import sessionmaker
+
+from libs.search import fulltext_relevance
+from models import DoctorModel
+from routers.admin.v1.crud import doctors
+
+COLUMNS = [DoctorModel.first_name, DoctorModel.last_name, DoctorModel.email, DoctorModel.number]
+
+
+@pytest.fixture
+def mysql_db():
+    # Compiles MySQL statements, never connects
+    return sessionmaker(bind=create_engine("mysql+pymysql://"))()
+
+
+def against(relevance):
+    return relevance.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}).string
+
+
+@pytest.mark.parametrize("search", ["Li", "of", "a.b", "www.com"])
+def test_unindexed_words_fall_back_to_like(mysql_db, search):
+    assert fulltext_relevance(mysql_db, COLUMNS, search) is None
+
+
+def test_only_indexed_words_are_required(mysql_db):
+    assert "AGAINST ('+gmail*' IN BOOLEAN MODE)" in against(fulltext_relevance(mysql_db, COLUMNS, "gmail.com"))
+    assert "AGAINST ('+Ada*' IN BOOLEAN MODE)" in against(fulltext_relevance(mysql_db, COLUMNS, "Ada Li"))
+
+
+@pytest.mark.parametrize("search", ["Li", "gmail.com"])
+def test_like_search_finds_short_surnames_and_email_domains(db, seed, search):
+    match = seed.doctor(last_name="Li", email="li@gmail.com")
+    seed.doctor(last_name="Smith", email="smith@example.org")
+    match_id = match.id
+    db.commit()
+
+    data = doctors.get_doctors_list(db, start=0, limit=10, search=search, sort_by="all", order="all")
+
+    assert [db_doctor.id for db_doctor in data["list"]] == [match_id]
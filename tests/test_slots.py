@@ -0,0 +1,15 @@
+from datetime import datetime
+
+import pytest
+
+from config import config
+from routers.admin.v1.crud.slots import get_slot_starts
+
+
+@pytest.mark.parametrize("slot_minutes", [15, 25, 45, 7])
+def test_overlapping_bookings_share_a_slot_across_midnight(monkeypatch, slot_minutes):
+    monkeypatch.setitem(config, "slot_minutes", slot_minutes)
+    before_midnight = get_slot_starts(datetime(2030, 1, 1, 23, 50), datetime(2030, 1, 2, 0, 30))
+    after_midnight = get_slot_starts(datetime(2030, 1, 2, 0, 10), datetime(2030, 1, 2, 0, 40))
+
+    assert set(before_midnight) & set(after_midnight)
@@ -0,0 +1,31 @@
+import pytest
+
+from routers.admin.v1.crud import specializations
+from routers.admin.v1.schemas import SpecializationAdd
+
+
+@pytest.fixture(autouse=True)
+def empty_catalog_cache():
+    specializations.catalog_cache.clear()
+    yield
+    specializations.catalog_cache.clear()
+
+
+def test_catalog_is_built_once_per_write(db, seed, count_queries):
+    seed.specialization(name="Cardiology")
+    db.commit()
+
+    with count_queries() as first:
+        catalog = specializations.get_specialization_catalog(db)
+    with count_queries() as repeat:
+        for _ in range(10):
+            assert specializations.get_specialization_catalog(db) == catalog
+    assert len(first) == 1
+    assert repeat == []
+
+    specializations.add_specialization(db, SpecializationAdd(name="Neurology", description=None))
+    with count_queries() as after_write:
+        changed = specializations.get_specialization_catalog(db)
+    assert len(after_write) == 1
+    assert changed.etag != catalog.etag
+    assert b"Neurology" in changed.body
@@ -0,0 +1,61 @@
+import pytest
+
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+from models import AppointmentModel, StatusEnum
+from routers.admin.v1 import schemas
+from routers.admin.v1.crud import appointments
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    # Captures the deltas instead of running the MySQL only upsert
+    calls = []
+    monkeypatch.setattr(
+        appointments, "record_stats", lambda db, removed=(), added=(): calls.append((list(removed), list(added)))
+    )
+    return calls
+
+
+def complete_elsewhere(engine, appointment_id: str):
+    # Another transaction, like the sweeper, completes the row after this session read it
+    other = sessionmaker(bind=engine)()
+    other.query(AppointmentModel).filter(AppointmentModel.id == appointment_id).update(
+        {AppointmentModel.status: StatusEnum.Complete}, synchronize_session=False
+    )
+    other.commit()
+    other.close()
+
+
+@pytest.mark.parametrize("write", ["status", "delete"])
+def test_stats_delta_starts_from_the_committed_row(engine, db, seed, recorded, write):
+    db_appointment, = seed.appointments(1, [seed.doctor()], [seed.patient()])
+    appointment_id = db_appointment.id
+    db.commit()
+    assert appointments.get_appointment_by_id(db, appointment_id).status == StatusEnum.Created
+
+    complete_elsewhere(engine, appointment_id)
+    if write == "status":
+        appointments.update_appointment_status(db, appointment_id, StatusEnum.Canceled, db_appointment.patient_id)
+    else:
+        appointments.delete_appointment(db, appointment_id)
+
+    (removed, added), = recorded
+    assert [stat.status for stat in removed] == [StatusEnum.Complete]
+
+
+def test_update_sees_a_row_completed_after_it_was_read(engine, db, seed, recorded):
+    doctor = seed.doctor()
+    db_appointment, = seed.appointments(1, [doctor], [seed.patient()])
+    appointment_id, doctor_id, from_time, to_time = db_appointment.id, doctor.id, db_appointment.from_time, db_appointment.to_time
+    db.commit()
+    appointments.get_appointment_by_id(db, appointment_id)
+
+    complete_elsewhere(engine, appointment_id)
+    update = schemas.AppointmentUpdate(doctor_id=doctor_id, from_time=from_time, to_time=to_time, description="Moved")
+    with pytest.raises(HTTPException) as e:
+        appointments.update_appointment(db, update, appointment_id)
+
+    assert e.value.status_code == 400
+    assert recorded == []